@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks for the dequindre scheduler.
+
+The benchmarks build synthetic DAGs of different shapes and sizes and time
+how long dequindre takes to construct, check, schedule, and dispatch them,
+and to load them from a snapshot.
+Tasks are never actually run; only dequindre's own overhead is measured.
+
+Run every benchmark and write the results as JSON:
+
+    $ python -m benchmarks --output results.json
+
+Compare against the results from a previous release:
+
+    $ python -m benchmarks --output new.json --compare results.json
+"""
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""Run the benchmarks and report the results as JSON.
+
+Every result is a dict with the shape, number of tasks, benchmark name, and
+best time in seconds out of `--repeat` runs.
+"""
+
+from argparse import ArgumentParser
+import json
+import os
+import platform
+import sys
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import dequindre
+from dequindre import DAG, Dequindre
+from dequindre.compact import CompactDAG, numpy
+
+from benchmarks.generators import GENERATORS
+
+
+SIZES = (10**2, 10**3, 10**4, 10**5, 10**6)
+
+
+class NoopDequindre(Dequindre):
+    """A Dequindre scheduler whose tasks do nothing."""
+
+    def run_task(self, task):
+        pass
+
+
+def best_time(func, repeat: int) -> float:
+    """Return the fastest of `repeat` calls to func, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        times.append(perf_counter() - start)
+
+    return min(times)
+
+
+def run_benchmarks(shapes, sizes, repeat: int = 3, max_workers: int = 1):
+    """Time each benchmark for every shape and size.
+
+    Args:
+        shapes (`list` of `str`): Keys of benchmarks.generators.GENERATORS.
+        sizes (`list` of `int`): Numbers of tasks.
+        repeat (int, optional): Runs per benchmark. The best run is kept.
+        max_workers (int, optional): Passed on to Dequindre.run_tasks.
+
+    Yields:
+        `dict`: One result per shape, size, and benchmark.
+    """
+    for shape in shapes:
+        generate = GENERATORS[shape]
+        for n in sizes:
+            dag = generate(n)
+            dq = NoopDequindre(dag)
+            with TemporaryDirectory() as tmp_dir:
+                snapshot = os.path.join(tmp_dir, f'{shape}.dag')
+                dag.save(snapshot)
+                benchmarks = {
+                    'construct': lambda: generate(n),
+                    'is_cyclic': dag.is_cyclic,
+                    'get_schedules': dq.get_schedules,
+                    'run_tasks': lambda: dq.run_tasks(max_workers=max_workers),
+                    # everything a scheduler does before its first task
+                    'load_dequindre': lambda: Dequindre(DAG.load(snapshot)),
+                }
+                compact = CompactDAG(dag)
+                benchmarks['get_levels_python'] = \
+                    lambda: compact.get_levels(use_numpy=False)
+                if numpy is not None:
+                    benchmarks['get_levels_numpy'] = \
+                        lambda: compact.get_levels(use_numpy=True)
+                for name, func in benchmarks.items():
+                    seconds = best_time(func, repeat)
+                    yield {
+                        'shape': shape,
+                        'tasks': len(dag.tasks),
+                        'edges': sum(len(v) for v
+                                     in dag.get_downstream().values()),
+                        'benchmark': name,
+                        'seconds': seconds,
+                    }
+
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    """Return the results that are slower than baseline by more than
+    tolerance, as a fraction of the baseline time."""
+    key = lambda r: (r['shape'], r['tasks'], r['benchmark'])
+    baseline = {key(r): r['seconds'] for r in baseline}
+
+    regressions = []
+    for r in results:
+        old = baseline.get(key(r))
+        if old is not None and r['seconds'] > old * (1 + tolerance):
+            regressions.append(dict(r, baseline_seconds=old))
+
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = ArgumentParser(prog='python -m benchmarks',
+                            description=__doc__.splitlines()[0])
+    parser.add_argument('--shapes', nargs='+', default=list(GENERATORS),
+                        choices=list(GENERATORS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(SIZES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-workers', type=int, default=1)
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='JSON from an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed slowdown against BASELINE, e.g. 0.2')
+    args = parser.parse_args(argv)
+
+    results = []
+    for r in run_benchmarks(args.shapes, args.sizes, args.repeat,
+                            args.max_workers):
+        print(f"{r['shape']:>16} {r['tasks']:>8} {r['benchmark']:>17} "
+              f"{r['seconds']:.4f}s", file=sys.stderr, flush=True)
+        results.append(r)
+
+    report = {
+        'dequindre_version': dequindre.__version__,
+        'python_version': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as ofile:
+            json.dump(report, ofile, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r') as ifile:
+            baseline = json.load(ifile)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION {r['shape']} {r['tasks']} {r['benchmark']}: "
+                  f"{r['baseline_seconds']:.4f}s -> {r['seconds']:.4f}s",
+                  file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
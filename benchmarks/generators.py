@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Synthetic DAG generators.
+
+Every generator takes the number of tasks `n` and returns a DAG with about
+that many tasks. The Tasks' locs are unique, and none of them exist.
+"""
+
+from random import Random
+
+from dequindre import Task, DAG
+
+
+def _isqrt(n: int) -> int:
+    return int(n ** 0.5)
+
+
+def _make_tasks(shape: str, n: int) -> list:
+    return [Task(f'{shape}/{i}.py') for i in range(n)]
+
+
+def chain(n: int) -> DAG:
+    """Each task depends on the one before it.
+
+    Example:
+        0 -> 1 -> 2 -> ... -> n-1
+    """
+    assert n >= 1, '`n` must be at least 1'
+    tasks = _make_tasks('chain', n)
+
+    return DAG(tasks={tasks[0]}, dependencies=dict(zip(tasks[1:], tasks)))
+
+
+def fan_out_fan_in(n: int) -> DAG:
+    """One source fans out to n - 2 tasks that fan back in to one sink."""
+    assert n >= 3, '`n` must be at least 3'
+    source, *middle, sink = _make_tasks('fan_out_fan_in', n)
+    dependencies = {t: source for t in middle}
+    dependencies[sink] = set(middle)
+
+    return DAG(dependencies=dependencies)
+
+
+def random_layered(n: int, width: int = None, max_upstream: int = 3,
+                   seed: int = 0) -> DAG:
+    """Tasks are split into layers, and every task below the first layer
+    depends on up to max_upstream random tasks from the layer above.
+
+    Args:
+        n (int): The number of tasks.
+        width (int, optional): Tasks per layer. Defaults to sqrt(n).
+        max_upstream (int, optional): Most upstream tasks per task.
+        seed (int, optional): Seed for the random number generator.
+    """
+    assert n >= 1, '`n` must be at least 1'
+    if width is None:
+        width = max(_isqrt(n), 1)
+    rng = Random(seed)
+    tasks = _make_tasks('random_layered', n)
+    layers = [tasks[i:i + width] for i in range(0, n, width)]
+
+    dependencies = {}
+    for above, layer in zip(layers, layers[1:]):
+        k = min(max_upstream, len(above))
+        for t in layer:
+            dependencies[t] = set(rng.sample(above, rng.randint(1, k)))
+
+    return DAG(tasks=set(layers[0]), dependencies=dependencies)
+
+
+def diamond_lattice(n: int) -> DAG:
+    """Tasks sit on a square grid, and each task depends on its neighbours
+    above and to the left. Rounds n down to a square number.
+
+    Example:
+        0 -> 1
+        |    |
+        v    v
+        2 -> 3
+    """
+    side = _isqrt(n)
+    assert side >= 1, '`n` must be at least 1'
+    tasks = _make_tasks('diamond_lattice', side * side)
+
+    dependencies = {}
+    for i in range(side):
+        for j in range(side):
+            upstream = set()
+            if i > 0:
+                upstream.add(tasks[(i - 1) * side + j])
+            if j > 0:
+                upstream.add(tasks[i * side + j - 1])
+            if upstream:
+                dependencies[tasks[i * side + j]] = upstream
+
+    return DAG(tasks={tasks[0]}, dependencies=dependencies)
+
+
+GENERATORS = {
+    'chain': chain,
+    'fan_out_fan_in': fan_out_fan_in,
+    'random_layered': random_layered,
+    'diamond_lattice': diamond_lattice,
+}
@@ -6,12 +6,19 @@ hold task-level data. DAGs are intended to hold relationships between Tasks.
 Dequindre schedules Tasks in accordance with the DAG.
 """
 
-from collections import defaultdict
-from copy import deepcopy
-from hashlib import md5
+import asyncio
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+import gc
+from heapq import heappush, heappop
+import json
 import os
-from typing import Dict, Set
-from subprocess import run as subprocess_run
+from shutil import which
+import time
+from types import MappingProxyType
+from typing import AsyncIterator, Dict, Iterator, Set
+from subprocess import Popen, PIPE, STDOUT
 from subprocess import check_output, CalledProcessError
 
 from dequindre.exceptions import CyclicGraphError, EarlyAbortError
@@ -20,47 +27,519 @@ from dequindre.exceptions import CyclicGraphError, EarlyAbortError
 __version__ = '0.10.0'
 
 
+def _wait_with_rusage(process: Popen):
+    """Wait for process to end and return its resource usage.
+
+    Returns:
+        `resource.struct_rusage`, or None where os.wait4 isn't supported.
+    """
+    if not hasattr(os, 'wait4'):
+        process.wait()
+        return None
+
+    _, status, rusage = os.wait4(process.pid, 0)
+    # the process is reaped, so let Popen know it's done
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+
+    return rusage
+
+
+@contextmanager
+def _gc_paused():
+    """Pause the garbage collector.
+
+    Building a large DAG makes many objects and no reference cycles, so
+    there's no point in letting the garbage collector scan them over and
+    over.
+    """
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _get_popen_kwargs(task: 'Task') -> dict:
+    """Popen arguments that run a task without a shell.
+
+    The interpreter is resolved to a full path, and close_fds is off, so
+    that subprocess can use posix_spawn where it's supported. Files opened
+    by Python aren't inherited by child processes anyway (PEP 446).
+    """
+    environ = None
+    if task.environ:
+        environ = dict(os.environ)
+        environ.update(task.environ)
+
+    executable = which(task.env) or task.env
+    loc = task.loc
+    if task.cwd is not None:
+        # relative paths are relative to dequindre, not to the task's cwd
+        loc = os.path.abspath(loc)
+        if os.path.dirname(executable):
+            executable = os.path.abspath(executable)
+
+    return {
+        'args': [executable, loc, *task.args],
+        'env': environ,
+        'cwd': task.cwd,
+        'close_fds': False,
+    }
+
+
+EnvLimit = namedtuple('EnvLimit', ['max_concurrency', 'max_launch_rate'])
+EnvLimit.__new__.__defaults__ = (None, None)
+EnvLimit.__doc__ = """Limits on the tasks that share a Task.env.
+
+Attributes:
+    max_concurrency (int): How many tasks with the env may run at once.
+        None doesn't limit them.
+    max_launch_rate (float): How many tasks with the env may start per
+        second. None doesn't limit them.
+"""
+
+
+class _Slots:
+    """Decide when ready tasks may start, given a run's resource capacity
+    and per-env limits.
+    """
+    def __init__(self, tasks: Set['Task'], capacity: dict,
+                 env_limits: Dict[str, EnvLimit]):
+        capacity = {} if capacity is None else capacity
+        assert isinstance(capacity, dict), '`capacity` must be a dict'
+        assert all(isinstance(k, str) and isinstance(v, (int, float))
+                   and v >= 0 for k, v in capacity.items()), \
+            '`capacity` must map strs to non-negative numbers'
+
+        self.available = dict(capacity)
+        # every task has to fit in the full capacity, or it could never start
+        too_big = sorted(t for t in tasks if not self._fits(t))
+        assert not too_big, f'{too_big[0]} needs more than the `capacity`'
+
+        self.env_limits = env_limits
+        self.env_running = defaultdict(int)
+        self.env_launched = {}
+
+
+    def _fits(self, task: 'Task') -> bool:
+        """Resources that aren't in the capacity aren't limited"""
+        available = self.available
+        return all(n <= available.get(k, n) for k, n in task.resources.items())
+
+
+    def get_delay(self, task: 'Task') -> float:
+        """Return how many seconds until task may start.
+
+        Returns:
+            float: 0 if it may start now, or inf if it has to wait for a
+            running task to end.
+        """
+        if not self._fits(task):
+            return float('inf')
+
+        limit = self.env_limits.get(task.env)
+        if limit is None:
+            return 0
+        if limit.max_concurrency is not None \
+                and self.env_running[task.env] >= limit.max_concurrency:
+            return float('inf')
+        if limit.max_launch_rate is not None \
+                and task.env in self.env_launched:
+            next_launch = self.env_launched[task.env] \
+                + 1 / limit.max_launch_rate
+            return max(next_launch - time.monotonic(), 0)
+
+        return 0
+
+
+    def take(self, task: 'Task') -> None:
+        """Take a task's slot as it starts"""
+        for k, n in task.resources.items():
+            if k in self.available:
+                self.available[k] -= n
+        self.env_running[task.env] += 1
+        self.env_launched[task.env] = time.monotonic()
+
+
+    def give_back(self, task: 'Task') -> None:
+        """Give back a task's slot when it ends"""
+        for k, n in task.resources.items():
+            if k in self.available:
+                self.available[k] += n
+        self.env_running[task.env] -= 1
+
+
+class _Dispatcher:
+    """The bookkeeping of one run of a Dequindre's DAG.
+
+    Dequindre.run_tasks, Dequindre.iter_tasks_async, and the distributed
+    Coordinator only differ in how they start tasks and wait for them to
+    end. Everything else is kept here: which tasks are ready, which may
+    start, which can be skipped, and what's recorded when a task ends.
+
+    Tasks are ready as soon as every one of their upstream tasks has
+    ended, and the ready tasks with the longest critical path start first.
+    Soft errors don't block downstream tasks.
+
+    Attributes:
+        dag (DAG): The tasks being run. A subdag with `only`.
+        ready (list): A heap of ready tasks, longest critical path first.
+        aborted (bool): A task failed under 'hard' error handling, so no
+            more tasks will start.
+        timeout (float): After start, seconds until a rate-limited task may
+            start, or None if every task that's waiting is waiting for a
+            running task to end.
+    """
+    def __init__(self, dequindre: 'Dequindre', error_handling: str = 'soft',
+                 durations: Dict['Task', float] = None, history=None,
+                 checkpoint: str = None, resume: bool = False,
+                 fingerprints=None, capacity: Dict[str, float] = None,
+                 only: Set['Task'] = None, include_upstream: bool = False,
+                 include_downstream: bool = False):
+        assert isinstance(error_handling, str), \
+            '`error_handling` must be a str'
+        assert error_handling in ('soft', 'hard'), \
+            "`error_handling` must be in ('soft', 'hard')"
+        assert checkpoint is not None or not resume, \
+            '`resume` requires a `checkpoint`'
+        assert only is not None \
+            or not (include_upstream or include_downstream), \
+            '`include_upstream` and `include_downstream` require `only`'
+
+        dag = dequindre.dag
+        if only is not None:
+            dag = dag.subdag(only, include_upstream, include_downstream)
+        self.dag = dag
+        self.error_handling = error_handling
+        self.slots = _Slots(dag.tasks, capacity, dequindre.env_limits)
+        self.fingerprints = fingerprints
+        # tasks skipped because they were up to date
+        self.unchanged = set()
+        # fingerprints of the running tasks, taken before they started
+        self.started_fingerprints = {}
+        self.aborted = False
+        self.timeout = None
+
+        self.skip = set()
+        self.journal = None
+        if checkpoint is not None:
+            if resume:
+                self.skip = dequindre.read_checkpoint(checkpoint)
+            self.journal = open(checkpoint, 'a' if resume else 'w')
+
+        self.history = history
+        if history is not None:
+            self.run_id = history.start_run()
+            if durations is None:
+                durations = history.get_duration_estimates(dag.tasks)
+        self.critical_paths = dequindre.get_critical_paths(durations)
+
+        # count the upstream tasks each task is still waiting on
+        self.waiting_on = {t: dag.get_in_degree(t) for t in dag.tasks}
+        self.ready = []
+        for t, n in self.waiting_on.items():
+            if n == 0:
+                self.push(t)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        if self.journal is not None:
+            self.journal.close()
+
+
+    def push(self, task: 'Task') -> None:
+        """Add a task to the ready heap"""
+        heappush(self.ready, (-self.critical_paths[task], task))
+
+
+    def release(self, task: 'Task') -> None:
+        """Queue the downstream tasks that are no longer waiting"""
+        for d in self.dag.get_task_downstream(task):
+            self.waiting_on[d] -= 1
+            if self.waiting_on[d] == 0:
+                self.push(d)
+
+
+    def _can_skip(self, task: 'Task') -> bool:
+        """Whether a ready task succeeded in the resumed run, or its outputs
+        are up to date. Takes the fingerprint of tasks that can't be skipped.
+        """
+        if task in self.skip:
+            print(f'\nSkipping {repr(task)}\n', flush=True)
+            return True
+
+        fingerprints = self.fingerprints
+        if fingerprints is not None and task.outputs:
+            fp = fingerprints.fingerprint(task)
+            if self.unchanged.issuperset(self.dag.get_task_upstream(task)) \
+                    and fingerprints.is_up_to_date(task, fp):
+                print(f'\nSkipping {repr(task)} (up to date)\n', flush=True)
+                self.unchanged.add(task)
+                return True
+            self.started_fingerprints[task] = fp
+
+        return False
+
+
+    def start(self, can_start) -> Iterator['Task']:
+        """Yield the ready tasks that may start now, and take their slots.
+
+        A ready task that doesn't fit in the capacity left, or whose env is
+        at its limit, waits, and other tasks behind it start instead.
+
+        Args:
+            can_start: Called before each task. Stops when it returns False,
+                like when every worker is busy.
+
+        Yields:
+            `Task`: Tasks to start now.
+        """
+        # ready tasks that can't start yet
+        deferred = []
+        timeout = float('inf')
+        while self.ready and not self.aborted and can_start():
+            entry = heappop(self.ready)
+            task = entry[1]
+            if self._can_skip(task):
+                self.release(task)
+                continue
+
+            delay = self.slots.get_delay(task)
+            if delay > 0:
+                timeout = min(timeout, delay)
+                deferred.append(entry)
+                continue
+
+            self.slots.take(task)
+            yield task
+
+        for entry in deferred:
+            heappush(self.ready, entry)
+        self.timeout = None if timeout == float('inf') else timeout
+
+
+    def requeue(self, task: 'Task') -> None:
+        """Put a started task back in the ready heap, like when the worker
+        running it was lost"""
+        self.slots.give_back(task)
+        self.push(task)
+
+
+    def end(self, task: 'Task', start: float, end: float, returncode: int,
+            rusage=None) -> None:
+        """Record that a task ended, and queue its downstream tasks.
+
+        Args:
+            task (`Task`): The task that ended.
+            start (float): Unix timestamp when the task started.
+            end (float): Unix timestamp when the task ended.
+            returncode (int): The task's exit status, or None if it couldn't
+                start.
+            rusage (`resource.struct_rusage`, optional): The task's resource
+                usage.
+        """
+        self.slots.give_back(task)
+        if returncode != 0 and self.error_handling == 'hard':
+            self.aborted = True
+
+        fp = self.started_fingerprints.pop(task, None)
+        if returncode == 0 and fp is not None:
+            self.fingerprints.update(task, fp)
+
+        if self.history is not None:
+            self.history.record(self.run_id, task, start, end, returncode,
+                                rusage)
+        if self.journal is not None:
+            entry = {'loc': task.loc, 'env': task.env,
+                     'returncode': returncode}
+            self.journal.write(json.dumps(entry) + '\n')
+            self.journal.flush()
+
+        self.release(task)
+
+
+TaskEvent = namedtuple('TaskEvent', ['task', 'returncode', 'start', 'end'])
+TaskEvent.__doc__ = """A task ended. Yielded by Dequindre.iter_tasks_async.
+
+Attributes:
+    task (`Task`): The task that ended.
+    returncode (int): The task's exit status, or None if it couldn't start.
+    start (float): Unix timestamp when the task started.
+    end (float): Unix timestamp when the task ended.
+"""
+
+
 class Task:
     """Define a Task and its relevant attributes.
 
     Note:
-        Tasks with the same loc and env are equal.
+        Tasks with the same loc and env are equal. Tasks are immutable, so
+        their hash is computed once, when the Task is created.
 
     Attributes:
         loc (str): location of the python script that runs the task.
         env (str, optional): Which environment to run.
+        inputs (`tuple` of `str`): Files the task reads.
+        outputs (`tuple` of `str`): Files the task writes.
+        args (`tuple` of `str`): Command line arguments for the script.
+        environ (`dict` of `str`: `str`): Environment variables set on top
+            of dequindre's own. Read-only.
+        cwd (str): Working directory to run the task in. None runs it in
+            dequindre's working directory.
+        resources (`dict` of `str`: `float`): How much of each resource the
+            task needs while it runs. Read-only.
     """
-    def __init__(self, loc: str, env: str = 'python'):
+    __slots__ = ('loc', 'env', 'inputs', 'outputs', 'args', 'environ', 'cwd',
+                 'resources', '_hash')
+
+    def __init__(self, loc: str, env: str = 'python',
+                 inputs: tuple = (), outputs: tuple = (),
+                 args: tuple = (), environ: dict = None, cwd: str = None,
+                 resources: dict = None):
         """Init a Task.
 
         Args:
             loc (str): location of the python script that runs the task.
-            env (str, optional): Which environment to run.
+            env (str, optional): Which environment to run. This is the path
+                to, or name of, the interpreter. It's run directly rather
+                than through a shell.
+            inputs (`tuple` of `str`, optional): Files the task reads.
+            outputs (`tuple` of `str`, optional): Files the task writes.
+                Tasks with outputs can be skipped when they're up to date.
+                See dequindre.fingerprints.
+            args (`tuple` of `str`, optional): Command line arguments for
+                the script.
+            environ (`dict` of `str`: `str`, optional): Environment
+                variables set on top of dequindre's own.
+            cwd (str, optional): Working directory to run the task in.
+                Relative locs are still relative to dequindre's working
+                directory.
+            resources (`dict` of `str`: `float`, optional): How much of each
+                resource the task needs while it runs, like
+                {'cpu': 4, 'memory': 30, 'db_connections': 1}. Names and
+                units are up to you; they only have to match the capacity
+                given to Dequindre.run_tasks.
+
+        Note:
+            args, environ, cwd, and resources aren't part of a Task's
+            identity. Tasks that run the same script in the same env are
+            equal.
         """
         assert isinstance(loc, str), 'loc must be a str'
         assert loc, 'loc cannot be an empty string'
         assert isinstance(env, str), 'env must be a str'
         assert env, 'env cannot be an empty string'
-
-        self.loc = loc
-        self.env = env
+        assert isinstance(inputs, (tuple, list)), 'inputs must be a tuple'
+        assert all(isinstance(p, str) and p for p in inputs), \
+            'inputs must be non-empty strs'
+        assert isinstance(outputs, (tuple, list)), 'outputs must be a tuple'
+        assert all(isinstance(p, str) and p for p in outputs), \
+            'outputs must be non-empty strs'
+        assert isinstance(args, (tuple, list)), 'args must be a tuple'
+        assert all(isinstance(a, str) for a in args), 'args must be strs'
+        environ = {} if environ is None else environ
+        assert isinstance(environ, (dict, MappingProxyType)), \
+            'environ must be a dict'
+        assert all(isinstance(k, str) and isinstance(v, str)
+                   for k, v in environ.items()), 'environ must map strs to strs'
+        assert cwd is None or (isinstance(cwd, str) and cwd), \
+            'cwd must be a non-empty str'
+        resources = {} if resources is None else resources
+        assert isinstance(resources, (dict, MappingProxyType)), \
+            'resources must be a dict'
+        assert all(isinstance(k, str) and isinstance(v, (int, float))
+                   and v >= 0 for k, v in resources.items()), \
+            'resources must map strs to non-negative numbers'
+
+        object.__setattr__(self, 'loc', loc)
+        object.__setattr__(self, 'env', env)
+        object.__setattr__(self, 'inputs', tuple(inputs))
+        object.__setattr__(self, 'outputs', tuple(outputs))
+        object.__setattr__(self, 'args', tuple(args))
+        object.__setattr__(self, 'environ', MappingProxyType(dict(environ)))
+        object.__setattr__(self, 'cwd', cwd)
+        object.__setattr__(self, 'resources',
+                           MappingProxyType(dict(resources)))
+        object.__setattr__(self, '_hash', hash((loc, env)))
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{Task.__qualname__} objects are immutable')
+
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{Task.__qualname__} objects are immutable')
+
+
+    def __copy__(self):
+        """Tasks are immutable, so a copy is the same Task"""
+        return self
+
+
+    def __deepcopy__(self, memo: dict):
+        """Tasks are immutable, so a copy is the same Task"""
+        return self
+
+
+    def __reduce__(self):
+        """Rebuild through __init__ when pickled"""
+        return (type(self), (self.loc, self.env, self.inputs, self.outputs,
+                             self.args, dict(self.environ), self.cwd,
+                             dict(self.resources)))
+
+
+    @classmethod
+    def _from_fields(cls, loc: str, env: str, inputs: tuple, outputs: tuple,
+                     args: tuple, environ: dict, cwd: str,
+                     resources: dict) -> 'Task':
+        """Build a Task from fields that are already known to be valid,
+        skipping the checks in __init__. Used to load DAG snapshots.
+
+        environ and resources may be read-only mappings already, to share
+        one empty mapping between many tasks.
+        """
+        task = cls.__new__(cls)
+        set_field = object.__setattr__
+        set_field(task, 'loc', loc)
+        set_field(task, 'env', env)
+        set_field(task, 'inputs', inputs)
+        set_field(task, 'outputs', outputs)
+        set_field(task, 'args', args)
+        set_field(task, 'environ', environ
+                  if isinstance(environ, MappingProxyType)
+                  else MappingProxyType(environ))
+        set_field(task, 'cwd', cwd)
+        set_field(task, 'resources', resources
+                  if isinstance(resources, MappingProxyType)
+                  else MappingProxyType(resources))
+        set_field(task, '_hash', hash((loc, env)))
+
+        return task
 
 
     def __hash__(self):
-        """md5 is fast, and chances of colision are really low"""
-        loc = self.loc
-        env = self.env
-        hash_str = '-'.join((loc, env))
-        big_int = int(md5(hash_str.encode()).hexdigest(), 16)
-
-        return big_int
+        """Tasks are hashed on (loc, env) when they're created"""
+        return self._hash
 
 
     def __eq__(self, other: 'Task') -> bool:
+        if self is other:
+            return True
         if not isinstance(other, type(self)):
             return False
 
-        return hash(self) == hash(other)
+        return (self._hash == other._hash
+                and self.loc == other.loc
+                and self.env == other.env)
 
 
     def __lt__(self, other: 'Task') -> bool:
@@ -93,20 +572,54 @@ class DAG:
     Attributes:
         tasks (`set` of `Task`): The set of all tasks. Dequindre will try to
             run every task in this attribute.
+        auto_reduce (bool): Whether dependencies that are already implied
+            by other dependencies are dropped. They're dropped all at once,
+            the next time the dependencies are read.
+        edges_reduced (int): How many dependencies transitive_reduction has
+            removed, including the ones auto_reduce dropped.
         _edges (`dict` of `Task`: `set` of `Task`): A dict of directed edges
             from one Task to a set of Tasks. Access directly at your own peril.
+        _upstream (`dict` of `Task`: `set` of `Task`): The reverse of _edges,
+            kept in step with it. Access directly at your own peril.
+        _sources (`set` of `Task`): Tasks with no upstream Tasks.
+        _sinks (`set` of `Task`): Tasks with no downstream Tasks.
+        _ancestors (`dict` of `Task`: `frozenset` of `Task`): Memoized
+            ancestors of the tasks that have been queried. Cleared when an
+            edge or task is removed or an edge is added.
+        _descendants (`dict` of `Task`: `frozenset` of `Task`): Memoized
+            descendants, like _ancestors.
+        _reduced (`dict` of `Task`: `set` of `Task`): The edges auto_reduce
+            dropped, so remove_task can bring back the ones that were only
+            implied through the removed task.
+        _reduce_pending (bool): auto_reduce has edges to drop.
     """
 
-    def __init__(self, *, tasks: set = None, dependencies: dict = None):
+    def __init__(self, *, tasks: set = None, dependencies: dict = None,
+                 auto_reduce: bool = False):
         """Init a DAG.
 
         Args:
             tasks (`set` of `Task`): Add Tasks to the DAG.
             dependencies (`dict` of `Task`: `set` of `Task`): Add dependencies
                 to the DAG.
+            auto_reduce (bool, optional): Keep the DAG transitively reduced.
+                See transitive_reduction. Removing a task keeps the
+                dependencies between its upstream and downstream tasks that
+                were dropped, just like a DAG that isn't reduced.
         """
+        assert isinstance(auto_reduce, bool), '`auto_reduce` must be a bool'
+
+        self.auto_reduce = auto_reduce
         self.tasks = set()
         self._edges = defaultdict(set)
+        self._upstream = defaultdict(set)
+        self._sources = set()
+        self._sinks = set()
+        self._ancestors = {}
+        self._descendants = {}
+        self._reduced = defaultdict(set)
+        self._reduce_pending = False
+        self._edges_reduced = 0
 
         if tasks is not None:
             assert isinstance(tasks, set), '`tasks` must be a set of tasks'
@@ -122,6 +635,39 @@ class DAG:
             return f"""{DAG.__qualname__}({repr(self.tasks)})"""
         return f"{DAG.__qualname__}({set()})"
 
+
+    def __contains__(self, task: Task) -> bool:
+        return task in self.tasks
+
+
+    def copy(self) -> 'DAG':
+        """Return a copy of the DAG that can be changed independently.
+
+        Tasks are immutable, so the copy shares them and only the sets and
+        dicts that hold them are copied. This is much faster than a
+        deepcopy, and just as safe.
+
+        Returns:
+            `DAG`
+        """
+        self._reduce_if_pending()
+        dag = DAG(auto_reduce=self.auto_reduce)
+        dag.tasks = set(self.tasks)
+        with _gc_paused():
+            dag._edges = defaultdict(set, {u: set(vs) for u, vs
+                                           in self._edges.items()})
+            dag._upstream = defaultdict(set, {v: set(us) for v, us
+                                              in self._upstream.items()})
+            dag._reduced = defaultdict(set, {u: set(vs) for u, vs
+                                             in self._reduced.items()})
+        dag._sources = set(self._sources)
+        dag._sinks = set(self._sinks)
+        dag._ancestors = dict(self._ancestors)
+        dag._descendants = dict(self._descendants)
+        dag._edges_reduced = self._edges_reduced
+
+        return dag
+
     # ------------------------------------------------------------------------
     # Config DAG
     # ------------------------------------------------------------------------
@@ -133,7 +679,12 @@ class DAG:
             task (`Task`): A Task object.
         """
         assert isinstance(task, Task), TypeError('task is not a Task')
+        if task in self.tasks:
+            return None
+
         self.tasks.add(task)
+        self._sources.add(task)
+        self._sinks.add(task)
 
 
     def add_tasks(self, tasks: set) -> None:
@@ -162,14 +713,27 @@ class DAG:
         """
         assert isinstance(task, Task), TypeError('task is not a dequindre Task')
 
+        # raise KeyError before touching any edges
         self.tasks.remove(task)
-
-        # remove task from edges
-        for k in self._edges:
-            if task in self._edges[k]:
-                self._edges[k].remove(task)
-        if task in self._edges:
-            del self._edges[task]
+        self._ancestors.clear()
+        self._descendants.clear()
+
+        for u in list(self._upstream.get(task, ())):
+            self._remove_edge(u, task)
+        for v in list(self._edges.get(task, ())):
+            self._remove_edge(task, v)
+        self._sources.discard(task)
+        self._sinks.discard(task)
+
+        if self._reduced:
+            # bring back the dropped edges, and drop the ones that are
+            # still implied without task next time
+            reduced, self._reduced = self._reduced, defaultdict(set)
+            for u, vs in reduced.items():
+                for v in vs:
+                    if task != u and task != v:
+                        self._add_edge(u, v)
+            self._reduce_pending = True
 
 
     def remove_tasks(self, tasks: set) -> None:
@@ -189,6 +753,34 @@ class DAG:
         for t in tasks:
             self.remove_task(t)
 
+
+    def _add_edge(self, u: Task, v: Task) -> None:
+        """Add the edge u -> v and update the indexes. No checks are made."""
+        if self._ancestors or self._descendants:
+            self._ancestors.clear()
+            self._descendants.clear()
+        self._edges[u].add(v)
+        self._upstream[v].add(u)
+        self._sinks.discard(u)
+        self._sources.discard(v)
+
+
+    def _remove_edge(self, u: Task, v: Task) -> None:
+        """Remove the edge u -> v and update the indexes."""
+        if self._ancestors or self._descendants:
+            self._ancestors.clear()
+            self._descendants.clear()
+        self._edges[u].remove(v)
+        if not self._edges[u]:
+            del self._edges[u]
+            self._sinks.add(u)
+
+        self._upstream[v].remove(u)
+        if not self._upstream[v]:
+            del self._upstream[v]
+            self._sources.add(v)
+
+
     def add_dependency(self, task: Task, depends_on: Task) -> None:
         """Add dependency to DAG.
 
@@ -212,22 +804,39 @@ class DAG:
         assert isinstance(depends_on, Task), TypeError('end is not a dequindre Task')
 
         self.add_tasks({task, depends_on})
-        self._edges[depends_on].add(task)
 
-        # cycles can only be introduced here
-        if self.is_cyclic():
-            msg = f'Adding the dependency {depends_on} -> {task}' \
+        # already added, and dropped by auto_reduce
+        if task in self._reduced.get(depends_on, ()):
+            return None
+
+        # cycles can only be introduced here, and only if depends_on is
+        # already reachable from task
+        if self._is_reachable(task, depends_on):
+            msg = f'Adding the dependency {depends_on} -> {task} ' \
                   f'introduced a cycle'
             raise CyclicGraphError(msg)
 
+        self._add_edge(depends_on, task)
+        if self.auto_reduce:
+            self._reduce_pending = True
+
 
     def add_dependencies(self, d: Dict[Task, Set[Task]]) -> None:
         """Add multiple dependencies to DAG
 
+        All the dependencies are added before the DAG is checked for cycles
+        once. Only the tasks downstream of the new dependencies are checked.
+        If any cycles are found, or any of the dependencies aren't Tasks,
+        none of the dependencies are added.
+
         Args:
             d (`dict` of `Task`: `set` of `Task`): An adjacency dict mapping
                 downstream Tasks to possibly many upstream tasks.
 
+        Raises:
+            CyclicGraphError: The dependencies introduced cycles. Every
+                cycle is listed in the error message.
+
         Note:
             If any tasks do not yet exist in DAG, the task will automatically
             be added to the dag.
@@ -240,20 +849,177 @@ class DAG:
             >>> dag = DAG()
             >>> dag.add_dependencies({steep_tea: {boil_water, prep_infuser}})
         """
+        # check everything before changing anything
+        edges = []
         for task, dependencies in d.items():
             if isinstance(dependencies, Task):
-                dependency = dependencies
-                self.add_dependency(task, dependency)
+                dependencies = {dependencies}
+            elif not isinstance(dependencies, set):
+                continue
+
+            assert isinstance(task, Task), \
+                TypeError('start is not a dequindre Task')
+            for dependency in dependencies:
+                assert isinstance(dependency, Task), \
+                    TypeError('end is not a dequindre Task')
+                edges.append((dependency, task))
+
+        new_tasks = set()
+        new_edges = []
+
+        def roll_back():
+            """Leave the DAG exactly as we found it"""
+            for u, v in new_edges:
+                self._remove_edge(u, v)
+            for t in new_tasks:
+                self.remove_task(t)
+
+        try:
+            for dependency, task in edges:
+                for t in (task, dependency):
+                    if t not in self.tasks:
+                        new_tasks.add(t)
+                        self.add_task(t)
+                if task not in self._edges.get(dependency, ()) \
+                        and task not in self._reduced.get(dependency, ()):
+                    self._add_edge(dependency, task)
+                    new_edges.append((dependency, task))
+
+            # every new cycle runs through a new edge. A small batch is
+            # checked edge by edge, like add_dependency, and only the tasks
+            # downstream of the new edges are searched for the cycle paths.
+            if len(new_edges) * 32 < len(self.tasks) and not any(
+                    self._is_reachable(v, u) for u, v in new_edges):
+                cycles = []
+            else:
+                cycles = self._get_cycles({v for _, v in new_edges})
+        except BaseException:
+            roll_back()
+            raise
+
+        if cycles:
+            roll_back()
+            paths = '; '.join(' -> '.join(str(t) for t in c) for c in cycles)
+            msg = f'Adding the dependencies introduced cycles: {paths}'
+            raise CyclicGraphError(msg)
+
+        if self.auto_reduce and new_edges:
+            self._reduce_pending = True
+
+
+    def transitive_reduction(self) -> int:
+        """Remove every dependency that's implied by other dependencies.
+
+        If A -> B -> C, then A -> C is redundant. Removing it doesn't change
+        which tasks depend on which, the priority levels, or the critical
+        paths, but every traversal has fewer edges to follow.
+
+        Returns:
+            int: How many dependencies were removed. edges_reduced keeps
+            the running total.
+
+        Example:
+            >>> dag = DAG(dependencies={B: A, C: {A, B}})
+            >>> dag.transitive_reduction()
+            1
+        """
+        self._reduce_pending = False
+        order = self.get_topological_order()
+        position = {t: i for i, t in enumerate(order)}
+        removed = 0
+
+        for u in order:
+            children = self._edges.get(u, ())
+            if len(children) < 2:
                 continue
-            elif isinstance(dependencies, set):
-                for dependency in dependencies:
-                    self.add_dependency(task, dependency)
+
+            # a child can only be reached through children before it in
+            # topological order, and only through tasks before the last one
+            children = sorted(children, key=position.__getitem__)
+            last = position[children[-1]]
+            reachable = set()
+            for v in children:
+                if v in reachable:
+                    self._remove_edge(u, v)
+                    if self.auto_reduce:
+                        self._reduced[u].add(v)
+                    removed += 1
+                    continue
+
+                stack = [v]
+                while stack:
+                    for d in self._edges.get(stack.pop(), ()):
+                        if d not in reachable and position[d] <= last:
+                            reachable.add(d)
+                            stack.append(d)
+
+        self._edges_reduced += removed
+
+        return removed
+
+
+    def _reduce_if_pending(self) -> None:
+        """Drop the edges auto_reduce is waiting to drop, if there are any"""
+        if self._reduce_pending:
+            self.transitive_reduction()
+
+
+    @property
+    def edges_reduced(self) -> int:
+        """How many dependencies transitive_reduction has removed"""
+        self._reduce_if_pending()
+        return self._edges_reduced
+
+    # ------------------------------------------------------------------------
+    # Snapshots
+    # ------------------------------------------------------------------------
+
+    def save(self, path: str) -> None:
+        """Save the DAG to a compact binary snapshot file.
+
+        See dequindre.snapshots for the format.
+
+        Args:
+            path (str): Location of the snapshot file.
+
+        Example:
+            >>> dag.save('./make-tea.dag')
+            >>> dag = DAG.load('./make-tea.dag')
+        """
+        from dequindre.snapshots import save_dag
+
+        save_dag(self, path)
+
+
+    @classmethod
+    def load(cls, path: str, use_mmap: bool = False) -> 'DAG':
+        """Load a DAG from a snapshot file written by DAG.save.
+
+        Loading skips the checks made by add_dependencies, so it's much
+        faster than building the DAG again.
+
+        Args:
+            path (str): Location of the snapshot file.
+            use_mmap (bool, optional): Map the file into memory instead of
+                reading it all at once.
+
+        Raises:
+            ValueError: The file isn't a DAG snapshot.
+
+        Returns:
+            `DAG`
+        """
+        from dequindre.snapshots import load_dag
+
+        return load_dag(path, use_mmap)
 
     # ------------------------------------------------------------------------
     # Graph Utilities
     # ------------------------------------------------------------------------
-    # nested loops are easier to read here. If time-complexity becomes a
-    # problem, the user clearly needs to use a full-featured scheduler
+    # The upstream and downstream indexes are kept up to date by every
+    # mutation, so none of these need to scan the whole graph. Dropping
+    # redundant edges doesn't change which tasks are reachable from which,
+    # so only the methods that read edges wait for auto_reduce.
 
     def get_downstream(self) -> dict:
         """Return adjacency dict of downstream Tasks.
@@ -261,7 +1027,8 @@ class DAG:
         Returns:
             `dict` of `Task`: `set` of `Task`
         """
-        downstream = {k: v for k, v in self._edges.items() if len(v) > 0}
+        self._reduce_if_pending()
+        downstream = {k: set(v) for k, v in self._edges.items() if v}
 
         return defaultdict(set, downstream)
 
@@ -272,12 +1039,48 @@ class DAG:
         Returns:
             `dict` of `Task`: `set` of `Task`
         """
-        upstream = defaultdict(set)
-        for u, d in self.get_downstream().items():
-            for v in d:
-                upstream[v].add(u)
+        self._reduce_if_pending()
+        upstream = {k: set(v) for k, v in self._upstream.items() if v}
+
+        return defaultdict(set, upstream)
 
-        return upstream
+
+    def get_task_downstream(self, task: Task) -> set:
+        """Return the set of Tasks that directly depend on task
+
+        Args:
+            task (`Task`): A task in the DAG.
+
+        Returns:
+            `set` of `Task`
+        """
+        self._reduce_if_pending()
+        return set(self._edges.get(task, ()))
+
+
+    def get_task_upstream(self, task: Task) -> set:
+        """Return the set of Tasks that task directly depends on
+
+        Args:
+            task (`Task`): A task in the DAG.
+
+        Returns:
+            `set` of `Task`
+        """
+        self._reduce_if_pending()
+        return set(self._upstream.get(task, ()))
+
+
+    def get_in_degree(self, task: Task) -> int:
+        """Return the number of Tasks that task directly depends on"""
+        self._reduce_if_pending()
+        return len(self._upstream.get(task, ()))
+
+
+    def get_out_degree(self, task: Task) -> int:
+        """Return the number of Tasks that directly depend on task"""
+        self._reduce_if_pending()
+        return len(self._edges.get(task, ()))
 
 
     def get_sources(self) -> set:
@@ -286,13 +1089,7 @@ class DAG:
         Returns:
             `set` of `Task`
         """
-        sources = set()
-        for t in self.tasks:
-            if t in self.get_upstream():
-                continue
-            sources.add(t)
-
-        return sources
+        return set(self._sources)
 
 
     def get_sinks(self) -> set:
@@ -301,36 +1098,282 @@ class DAG:
         Returns:
             `set` of `Task`
         """
-        sinks = set()
-        for t in self.tasks:
-            if t in self.get_downstream():
-                continue
-            sinks.add(t)
+        return set(self._sinks)
 
-        return sinks
 
+    def _get_closure(self, task: Task, edges: dict, cache: dict) -> frozenset:
+        """Helper function for ancestors and descendants
 
-    def _is_cyclic(self, task, visited, stack) -> bool:
-        """Helper function for is_cyclic
+        Finds every task reachable from task along edges. The search stops
+        at tasks whose own closure is already cached, and uses it instead.
 
         Returns:
-            True if cycle detected. False otherwise.
+            `frozenset` of `Task`
         """
-        visited[task] = True
-        stack[task] = True
+        closure = cache.get(task)
+        if closure is not None:
+            return closure
 
-        for d in self.get_downstream()[task]:
-            if not visited[d]:
-                if self._is_cyclic(d, visited, stack):
-                    return True
-            elif stack[d]:
-                return True
+        seen = set()
+        stack = [task]
+        while stack:
+            for d in edges.get(stack.pop(), ()):
+                if d in seen:
+                    continue
+                seen.add(d)
+                cached = cache.get(d)
+                if cached is None:
+                    stack.append(d)
+                else:
+                    seen.update(cached)
+
+        closure = cache[task] = frozenset(seen)
+
+        return closure
+
+
+    def ancestors(self, tasks) -> set:
+        """Return every Task that tasks depend on, directly or not.
+
+        Each task's ancestors are memoized until the DAG changes.
+
+        Args:
+            tasks (`Task` or `set` of `Task`): Tasks in the DAG.
+
+        Returns:
+            `set` of `Task`
+        """
+        if isinstance(tasks, Task):
+            tasks = {tasks}
+        assert all(t in self.tasks for t in tasks), \
+            '`tasks` must be in the DAG'
+
+        ancestors = set()
+        for t in tasks:
+            ancestors.update(
+                self._get_closure(t, self._upstream, self._ancestors))
+
+        return ancestors
+
+
+    def descendants(self, tasks) -> set:
+        """Return every Task that depends on tasks, directly or not.
+
+        Each task's descendants are memoized until the DAG changes.
 
-        stack[task] = False
+        Args:
+            tasks (`Task` or `set` of `Task`): Tasks in the DAG.
+
+        Returns:
+            `set` of `Task`
+        """
+        if isinstance(tasks, Task):
+            tasks = {tasks}
+        assert all(t in self.tasks for t in tasks), \
+            '`tasks` must be in the DAG'
+
+        descendants = set()
+        for t in tasks:
+            descendants.update(
+                self._get_closure(t, self._edges, self._descendants))
+
+        return descendants
+
+
+    def subdag(self, tasks, include_upstream: bool = False,
+               include_downstream: bool = False) -> 'DAG':
+        """Return a new DAG of some tasks and the dependencies between them.
+
+        If a selected task depends on another through tasks that weren't
+        selected, it depends on it directly in the new DAG.
+
+        Args:
+            tasks (`Task` or `set` of `Task`): Tasks in the DAG.
+            include_upstream (bool, optional): Also include every task that
+                tasks depend on.
+            include_downstream (bool, optional): Also include every task
+                that depends on tasks.
+
+        Returns:
+            `DAG`
+
+        Example:
+            >>> rerun = make_tea.subdag(pour_tea, include_downstream=True)
+        """
+        if isinstance(tasks, Task):
+            tasks = {tasks}
+        assert all(t in self.tasks for t in tasks), \
+            '`tasks` must be in the DAG'
+
+        self._reduce_if_pending()
+        selected = set(tasks)
+        if include_upstream:
+            selected |= self.ancestors(tasks)
+        if include_downstream:
+            selected |= self.descendants(tasks)
+
+        # part of a DAG can't have cycles, so skip the checks
+        subdag = DAG()
+        subdag.add_tasks(selected)
+        for u in selected:
+            # keep dependencies that go through tasks that were left out
+            seen = set()
+            stack = [u]
+            while stack:
+                for v in self._edges.get(stack.pop(), ()):
+                    if v in seen:
+                        continue
+                    seen.add(v)
+                    if v in selected:
+                        subdag._add_edge(u, v)
+                    else:
+                        stack.append(v)
+
+        return subdag
+
+
+    def _is_reachable(self, start: Task, end: Task) -> bool:
+        """Helper function for add_dependency
+
+        Searches downstream from start and upstream from end at the same
+        time, growing the smaller frontier first, so only the region
+        between the two tasks is visited.
+
+        Returns:
+            True if end is start or is downstream of start. False otherwise.
+        """
+        if start == end:
+            return True
+
+        forward, backward = {start}, {end}
+        forward_frontier, backward_frontier = [start], [end]
+        go_forward = True
+        while forward_frontier and backward_frontier:
+            # take turns when the frontiers are the same size
+            if len(forward_frontier) != len(backward_frontier):
+                go_forward = len(forward_frontier) < len(backward_frontier)
+            else:
+                go_forward = not go_forward
+
+            if go_forward:
+                edges, seen, other = self._edges, forward, backward
+                frontier = forward_frontier
+            else:
+                edges, seen, other = self._upstream, backward, forward
+                frontier = backward_frontier
+
+            next_frontier = []
+            for t in frontier:
+                for d in edges.get(t, ()):
+                    if d in other:
+                        return True
+                    if d not in seen:
+                        seen.add(d)
+                        next_frontier.append(d)
+
+            if frontier is forward_frontier:
+                forward_frontier = next_frontier
+            else:
+                backward_frontier = next_frontier
 
         return False
 
 
+    def _get_strongly_connected(self, roots: set = None) -> list:
+        """Helper function for _get_cycles
+
+        Tarjan's algorithm, with an explicit stack in place of recursion.
+
+        Args:
+            roots (`set` of `Task`): Only find the components downstream of
+                these Tasks. Defaults to every Task.
+
+        Returns:
+            `list` of `list` of `Task`: Every strongly connected component.
+        """
+        index = {}
+        lowlink = {}
+        on_stack = set()
+        stack = []
+        components = []
+
+        for root in self.tasks if roots is None else roots:
+            if root in index:
+                continue
+
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self._edges.get(root, ())))]
+            while work:
+                v, children = work[-1]
+                for w in children:
+                    if w not in index:
+                        index[w] = lowlink[w] = len(index)
+                        stack.append(w)
+                        on_stack.add(w)
+                        work.append((w, iter(self._edges.get(w, ()))))
+                        break
+                    elif w in on_stack:
+                        lowlink[v] = min(lowlink[v], index[w])
+                else:
+                    work.pop()
+                    if work:
+                        u = work[-1][0]
+                        lowlink[u] = min(lowlink[u], lowlink[v])
+                    if lowlink[v] == index[v]:
+                        component = []
+                        while True:
+                            w = stack.pop()
+                            on_stack.remove(w)
+                            component.append(w)
+                            if w == v:
+                                break
+                        components.append(component)
+
+        return components
+
+
+    def _get_cycles(self, roots: set = None) -> list:
+        """Find one cycle through each strongly connected component.
+
+        Args:
+            roots (`set` of `Task`): Only look for cycles downstream of these
+                Tasks. Defaults to every Task.
+
+        Returns:
+            `list` of `list` of `Task`: Cycle paths that start and end on the
+            same Task. Empty if the DAG is acyclic.
+        """
+        cycles = []
+        for component in self._get_strongly_connected(roots):
+            start = min(component)
+            if len(component) == 1 and start not in self._edges.get(start, ()):
+                continue
+
+            # breadth-first search inside the component, back to start
+            members = set(component)
+            parents = {}
+            queue = deque([start])
+            while start not in parents:
+                t = queue.popleft()
+                for d in self._edges.get(t, ()):
+                    if d in members and d not in parents:
+                        parents[d] = t
+                        queue.append(d)
+
+            path = [start]
+            t = parents[start]
+            while t != start:
+                path.append(t)
+                t = parents[t]
+            path.append(start)
+            path.reverse()
+            cycles.append(path)
+
+        return cycles
+
+
     def is_cyclic(self) -> bool:
         """Detect if the DAG is cyclic.
 
@@ -341,35 +1384,118 @@ class DAG:
         ## I used this source as reference, but the algorithm is pretty well
         ## documented everywhere
         ## https://www.geeksforgeeks.org/detect-cycle-in-a-graph/
+        ## The recursion is replaced by an explicit stack so that long chains
+        ## of tasks can't hit the recursion limit.
 
-        visited = {t: False for t in self.tasks}
-        # which tasks are in recursion stack
-        stack = {t: False for t in self.tasks}
-        for task in self.tasks:
-            if not visited[task]:
-                if self._is_cyclic(task, visited, stack):
-                    return True
+        visited = set()
+        # which tasks are on the current path
+        on_path = set()
+        for root in self.tasks:
+            if root in visited:
+                continue
+
+            visited.add(root)
+            on_path.add(root)
+            stack = [(root, iter(self._edges.get(root, ())))]
+            while stack:
+                task, children = stack[-1]
+                for d in children:
+                    if d in on_path:
+                        return True
+                    if d not in visited:
+                        visited.add(d)
+                        on_path.add(d)
+                        stack.append((d, iter(self._edges.get(d, ()))))
+                        break
+                else:
+                    stack.pop()
+                    on_path.remove(task)
 
         return False
 
 
+    def get_topological_order(self) -> list:
+        """Return every Task, each one after all of its upstream Tasks.
+
+        Raises:
+            CyclicGraphError: The DAG has no topological order.
+
+        Returns:
+            `list` of `Task`
+        """
+        self._reduce_if_pending()
+        waiting_on = {t: self.get_in_degree(t) for t in self.tasks}
+        order = sorted(t for t, n in waiting_on.items() if n == 0)
+
+        # order doubles as the queue of tasks to visit
+        for task in order:
+            for d in sorted(self._edges.get(task, ())):
+                waiting_on[d] -= 1
+                if waiting_on[d] == 0:
+                    order.append(d)
+
+        if len(order) != len(self.tasks):
+            raise CyclicGraphError('The DAG has no topological order')
+
+        return order
+
+
 class Dequindre:
     """The Dequindre scheduler handles all the scheduling computations.
 
     Attributes:
-        dag (DAG): A copy of the originally supplied DAG. This attribute is
-            trimmed while planning the schedule.
+        dag (DAG): A copy of the originally supplied DAG. Planning the
+            schedule only reads from it. The copy shares the original's
+            Tasks. A `dequindre.compact.CompactDAG` is read-only, so it
+            isn't copied.
         original_dag (DAG): The originally supplied DAG. Used to refresh dag
-            after the schedule is planned.
+            if it's changed.
+        warm_pool (`dequindre.warm.WarmPool`): Runs tasks in pre-warmed
+            interpreters. None starts a new interpreter for every task.
+        logs (`dequindre.logs.TaskLogs`): Captures each task's output in its
+            own log file. None lets tasks write to dequindre's terminal.
+        env_limits (`dict` of `str`: `EnvLimit`): Concurrency and launch
+            rate limits on the tasks that share a Task.env.
     """
-    def __init__(self, dag: DAG):
+    def __init__(self, dag: DAG, warm_pool=None, logs=None,
+                 env_limits: Dict[str, EnvLimit] = None):
         """Init a Dequindre scheduler.
 
         Args:
             dag (DAG): A DAG of tasks and dependencies to be scheduled.
+            warm_pool (`dequindre.warm.WarmPool`, optional): Run tasks in
+                pre-warmed interpreters from this pool.
+            logs (`dequindre.logs.TaskLogs`, optional): Capture each task's
+                output in its own log file. Not supported with warm_pool.
+            env_limits (`dict` of `str`: `EnvLimit`, optional): Limit how
+                many tasks with an env run at once, and how quickly they
+                start. The commons env factories collect these for you.
+
+        Example:
+            >>> from dequindre import EnvLimit
+            >>> dq = Dequindre(dag, env_limits={
+            ...     '/shared/envs/python36/bin/python': EnvLimit(2, 0.5)})
         """
+        assert warm_pool is None or logs is None, \
+            '`logs` are not supported with a `warm_pool`'
+        env_limits = {} if env_limits is None else env_limits
+        assert isinstance(env_limits, dict), '`env_limits` must be a dict'
+        for limit in env_limits.values():
+            assert isinstance(limit, EnvLimit), \
+                '`env_limits` must map envs to EnvLimits'
+            assert limit.max_concurrency is None \
+                or (isinstance(limit.max_concurrency, int)
+                    and limit.max_concurrency >= 1), \
+                '`max_concurrency` must be an int of at least 1'
+            assert limit.max_launch_rate is None \
+                or limit.max_launch_rate > 0, \
+                '`max_launch_rate` must be positive'
+
         self.original_dag = dag
-        self.refresh_dag()
+        self.warm_pool = warm_pool
+        self.logs = logs
+        self.env_limits = dict(env_limits)
+        self.dag = dag.copy()
 
 
     def __repr__(self):
@@ -377,8 +1503,8 @@ class Dequindre:
 
 
     def refresh_dag(self) -> None:
-        """Create a deepcopy of the original_dag."""
-        self.dag = deepcopy(self.original_dag)
+        """Copy the original_dag again, dropping any changes made to dag."""
+        self.dag = self.original_dag.copy()
 
 
     def get_task_schedules(self) -> Dict[Task, int]:
@@ -396,19 +1522,29 @@ class Dequindre:
             }
         """
         dag = self.dag  # copy to something easier to read
+        if hasattr(dag, 'get_task_levels'):
+            # a CompactDAG finds levels on its task numbers
+            return defaultdict(int, dag.get_task_levels())
+
         task_priority = defaultdict(int)
-        visited = set()
+
+        # Kahn's algorithm, one priority level at a time. A task joins the
+        # next level once every one of its upstream tasks has a level.
+        waiting_on = {t: dag.get_in_degree(t) for t in dag.tasks}
+        level = [t for t, n in waiting_on.items() if n == 0]
         i = 1
 
-        while dag.get_sources():
-            task_priority.update({t: i for t in dag.get_sources()})
-            for t in dag.get_sources():
-                visited.add(t)
-                dag.remove_task(t)
+        while level:
+            next_level = []
+            for t in level:
+                task_priority[t] = i
+                for d in dag.get_task_downstream(t):
+                    waiting_on[d] -= 1
+                    if waiting_on[d] == 0:
+                        next_level.append(d)
+            level = next_level
             i += 1
 
-        self.refresh_dag()
-
         return task_priority
 
 
@@ -428,45 +1564,425 @@ class Dequindre:
         for k, v in task_priorities.items():
             priorities[v].add(k)
 
-        self.refresh_dag()
-
         return priorities
 
 
-    def run_task(self, task: Task) -> None:
+    def get_critical_paths(self,
+                           durations: Dict[Task, float] = None) \
+                           -> Dict[Task, float]:
+        """Find the length of the longest path from each task to a sink
+
+        The length of a path is the sum of the expected durations of its
+        tasks, including the task it starts from.
+
+        Args:
+            durations (`dict` of `Task`: `float`, optional): Expected task
+                durations. Tasks that are missing are assumed to take the
+                average of the known durations. By default, every task is
+                assumed to take 1, so lengths count tasks.
+
+        Returns:
+            `dict` of `Task`: `float`
+
+        Example:
+            make_tea -> pour_tea -> drink_tea will give the dict
+            {
+                make_tea: 3,
+                pour_tea: 2,
+                drink_tea: 1
+            }
+        """
+        dag = self.dag
+        durations = durations or {}
+        default = sum(durations.values()) / len(durations) if durations else 1
+
+        critical_paths = {}
+        for t in reversed(dag.get_topological_order()):
+            longest = max((critical_paths[d]
+                           for d in dag.get_task_downstream(t)), default=0)
+            critical_paths[t] = durations.get(t, default) + longest
+
+        return critical_paths
+
+
+    def run_task(self, task: Task):
         """Run the python file defined by Task.loc in the environment defined
         by the Task.env
 
         Args:
             task (`Task`): The task to be run.
+
+        Raises:
+            CalledProcessError: The task failed. Its resource usage is
+                attached as the rusage attribute. If logs are captured, the
+                end of the task's output is the output attribute.
+
+        Returns:
+            `resource.struct_rusage`: The task's resource usage, or None
+            where it isn't available.
         """
-        assert hash(task) in [hash(t) for t in self.dag.tasks], \
-            ValueError(f'{task} is not in the dag')
+        assert task in self.dag, ValueError(f'{task} is not in the dag')
 
         print(f'\nRunning {repr(task)}\n', flush=True)
-        subprocess_run(f'{task.env} {task.loc}', shell=True, check=True)
+        if self.warm_pool is not None:
+            rusage = self.warm_pool.run(task)
+            returncode, args = rusage.returncode, [task.env, task.loc]
+        elif self.logs is not None:
+            log = self.logs.open(task)
+            try:
+                process = Popen(**_get_popen_kwargs(task), stdout=PIPE,
+                                stderr=STDOUT)
+                # drain the pipe as it fills so the task never blocks
+                with process.stdout:
+                    fd = process.stdout.fileno()
+                    for chunk in iter(lambda: os.read(fd, 1 << 16), b''):
+                        log.write(chunk)
+            finally:
+                log.close()
+            rusage = _wait_with_rusage(process)
+            returncode, args = process.returncode, process.args
+        else:
+            process = Popen(**_get_popen_kwargs(task))
+            rusage = _wait_with_rusage(process)
+            returncode, args = process.returncode, process.args
+
+        if returncode != 0:
+            output = None if self.logs is None else log.tail
+            err = CalledProcessError(returncode, args, output=output)
+            err.rusage = rusage
+            raise err
+
+        return rusage
+
+
+    def _run_timed_task(self, task: Task) -> tuple:
+        """Helper function for run_tasks
+
+        Returns:
+            The start and end timestamps, resource usage, and the exception
+            raised by run_task, if any.
+        """
+        start = time.time()
+        try:
+            rusage = self.run_task(task)
+            err = None
+        except Exception as e:
+            rusage = getattr(e, 'rusage', None)
+            err = e
+
+        return start, time.time(), rusage, err
+
 
+    def read_checkpoint(self, checkpoint: str) -> Set[Task]:
+        """Find the tasks a resumed run can skip.
 
-    def run_tasks(self, error_handling: str = 'soft') -> None:
+        A task can be skipped if its latest entry in the checkpoint journal
+        is a success, none of its upstream tasks failed, and none of its
+        upstream tasks ran after it. Everything downstream of a failed or
+        rerun task is run again.
+
+        Args:
+            checkpoint (str): Location of the checkpoint journal written by
+                run_tasks.
+
+        Returns:
+            `set` of `Task`: Tasks in the DAG that can be skipped.
+        """
+        # position of each task's latest entry, and whether it succeeded
+        latest = {}
+        if os.path.exists(checkpoint):
+            with open(checkpoint, 'r') as ifile:
+                for i, line in enumerate(ifile):
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    task = Task(entry['loc'], entry['env'])
+                    if task in self.dag:
+                        latest[task] = (i, entry['returncode'] == 0)
+
+        # position of the latest entry for a task or any of its ancestors
+        newest = {}
+        for task in self.dag.get_topological_order():
+            newest[task] = max(
+                [latest.get(task, (-1,))[0]]
+                + [newest[u] for u in self.dag.get_task_upstream(task)])
+
+        # everything downstream of a failure has to run again
+        failed = {t for t, (_, ok) in latest.items() if not ok}
+        stale = failed | self.dag.descendants(failed)
+
+        return {t for t, (i, ok) in latest.items()
+                if ok and i == newest[t] and t not in stale}
+
+
+    def run_tasks(self, error_handling: str = 'soft',
+                  max_workers: int = 1,
+                  durations: Dict[Task, float] = None,
+                  history=None,
+                  checkpoint: str = None,
+                  resume: bool = False,
+                  fingerprints=None,
+                  capacity: Dict[str, float] = None,
+                  only: Set[Task] = None,
+                  include_upstream: bool = False,
+                  include_downstream: bool = False) -> None:
         """Run all tasks on the DAG.
 
+        Each task is started as soon as all of its upstream tasks are
+        complete, rather than waiting on the rest of its priority level.
+        When more tasks are ready than can run, the tasks with the longest
+        critical path start first. A ready task that doesn't fit in the
+        capacity left, or whose env is at its limit, waits, and other tasks
+        behind it start instead.
+
         Args:
             error_handling (str): Either 'soft' or 'hard'. 'hard' error
                 handling will abort the schedule after the first error.
+            max_workers (int, optional): How many tasks may run at once.
+                Defaults to 1, which runs every task in turn.
+            durations (`dict` of `Task`: `float`, optional): Expected task
+                durations used to rank ready tasks. See get_critical_paths.
+            history (`dequindre.history.RunHistory`, optional): Record every
+                task run here. If durations isn't given, the median of each
+                task's past durations is used instead.
+            checkpoint (str, optional): Location of a checkpoint journal.
+                Every task is written to the journal as soon as it ends.
+            resume (bool, optional): Resume the run recorded in checkpoint.
+                Tasks that succeeded are skipped, unless they're downstream
+                of a task that failed. See read_checkpoint.
+            fingerprints (`dequindre.fingerprints.FingerprintStore`,
+                optional): Skip tasks whose outputs are up to date, as long
+                as none of their upstream tasks ran.
+            capacity (`dict` of `str`: `float`, optional): How much of each
+                resource the running tasks may use in total, like
+                {'cpu': 16, 'memory': 64}. See Task.resources. Resources
+                that aren't in the capacity aren't limited.
+            only (`Task` or `set` of `Task`, optional): Run only these
+                tasks, in dependency order, instead of the whole DAG.
+            include_upstream (bool, optional): With only, also run every
+                task they depend on.
+            include_downstream (bool, optional): With only, also run every
+                task that depends on them.
+
+        Note:
+            Each task already runs in its own subprocess, so tasks are
+            launched from a pool of threads.
         """
-        assert isinstance(error_handling, str), \
-            '`error_handling` must be a str'
-        assert error_handling in ('soft', 'hard'), \
-            "`error_handling` must be in ('soft', 'hard')"
+        assert isinstance(max_workers, int), '`max_workers` must be an int'
+        assert max_workers >= 1, '`max_workers` must be at least 1'
+
+        running = {}
+        with _Dispatcher(self, error_handling, durations, history,
+                         checkpoint, resume, fingerprints, capacity, only,
+                         include_upstream, include_downstream) as run, \
+                ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while run.ready or running:
+                for task in run.start(lambda: len(running) < max_workers):
+                    future = executor.submit(self._run_timed_task, task)
+                    running[future] = task
+
+                if not running:
+                    if run.timeout is None:
+                        break
+                    time.sleep(run.timeout)
+                    continue
+
+                done, _ = wait(running, timeout=run.timeout,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    start, end, rusage, err = future.result()
+                    returncode = 0
+                    if err is not None:
+                        print(err, flush=True)
+                        if getattr(err, 'output', None):
+                            print(err.output.decode(errors='replace'),
+                                  flush=True)
+                        returncode = getattr(err, 'returncode', None)
+                    run.end(task, start, end, returncode, rusage)
+
+        if run.aborted:
+            raise EarlyAbortError()
+
+
+    async def _run_task_async(self, task: Task) -> int:
+        """Helper function for iter_tasks_async
+
+        Returns:
+            The task's exit status. The task is killed if this is cancelled.
+        """
+        print(f'\nRunning {repr(task)}\n', flush=True)
+        if self.warm_pool is not None:
+            loop = asyncio.get_event_loop()
+            future = loop.run_in_executor(None, self.warm_pool.run, task)
+            try:
+                # shielded, so the result can still be waited for once the
+                # task is killed
+                result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                self.warm_pool.kill(task)
+                await future
+                raise
+            return result.returncode
+
+        kwargs = _get_popen_kwargs(task)
+        args = kwargs.pop('args')
+        if self.logs is None:
+            process = await asyncio.create_subprocess_exec(*args, **kwargs)
+            log = None
+        else:
+            process = await asyncio.create_subprocess_exec(
+                *args, **kwargs, stdout=PIPE, stderr=STDOUT)
+            log = self.logs.open(task)
+
+        try:
+            if log is not None:
+                while True:
+                    chunk = await process.stdout.read(1 << 16)
+                    if not chunk:
+                        break
+                    log.write(chunk)
+            return await process.wait()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        finally:
+            if log is not None:
+                log.close()
+
+
+    async def iter_tasks_async(self, error_handling: str = 'soft',
+                               max_workers: int = 8,
+                               durations: Dict[Task, float] = None,
+                               capacity: Dict[str, float] = None,
+                               history=None,
+                               checkpoint: str = None,
+                               resume: bool = False,
+                               fingerprints=None,
+                               only: Set[Task] = None,
+                               include_upstream: bool = False,
+                               include_downstream: bool = False) \
+                               -> AsyncIterator[TaskEvent]:
+        """Run all tasks on the DAG without blocking the event loop.
+
+        Tasks are dispatched like run_tasks: as soon as their upstream tasks
+        are complete and their resources and env are free, longest critical
+        path first. Dispatching carries on while the caller handles an
+        event, and later events wait for it. Cancelling the run, or closing
+        the iterator early, kills every running task.
 
-        self.refresh_dag()  # refresh just in case
-        priorities = self.get_schedules()
+        Args:
+            error_handling (str): Either 'soft' or 'hard'. 'hard' error
+                handling will abort the schedule after the first error.
+            max_workers (int, optional): How many tasks may run at once.
+            durations (`dict` of `Task`: `float`, optional): Expected task
+                durations used to rank ready tasks. See get_critical_paths.
+            capacity (`dict` of `str`: `float`, optional): How much of each
+                resource the running tasks may use in total. See run_tasks.
+            history, checkpoint, resume, fingerprints, only,
+            include_upstream, include_downstream: See run_tasks.
+
+        Raises:
+            EarlyAbortError: A task failed under 'hard' error handling. It's
+                raised after every running task has ended.
+
+        Yields:
+            `TaskEvent`: One event per task that ran, as it ends. Skipped
+            tasks don't have events.
 
-        for _, tasks in priorities.items():
-            for task in tasks:
+        Example:
+            >>> async for event in dq.iter_tasks_async(max_workers=4):
+            ...     print(event.task, event.returncode)
+        """
+        assert isinstance(max_workers, int), '`max_workers` must be an int'
+        assert max_workers >= 1, '`max_workers` must be at least 1'
+
+        async def run_timed(task):
+            start = time.time()
+            try:
+                returncode = await self._run_task_async(task)
+            except (OSError, ValueError) as err:
+                print(err, flush=True)
+                returncode = None
+            return TaskEvent(task, returncode, start, time.time())
+
+        # events wait here, so tasks keep being dispatched while the
+        # consumer is busy with an earlier event
+        events = asyncio.Queue()
+
+        async def dispatch():
+            running = {}
+            with _Dispatcher(self, error_handling, durations, history,
+                             checkpoint, resume, fingerprints, capacity,
+                             only, include_upstream,
+                             include_downstream) as run:
                 try:
-                    self.run_task(task)
-                except Exception as err:
-                    print(err, flush=True)
-                    if error_handling == 'hard':
-                        raise EarlyAbortError()
+                    while run.ready or running:
+                        for task in run.start(
+                                lambda: len(running) < max_workers):
+                            future = asyncio.ensure_future(run_timed(task))
+                            running[future] = task
+
+                        if not running:
+                            if run.timeout is None:
+                                break
+                            await asyncio.sleep(run.timeout)
+                            continue
+
+                        done, _ = await asyncio.wait(
+                            running, timeout=run.timeout,
+                            return_when=asyncio.FIRST_COMPLETED)
+                        for future in done:
+                            del running[future]
+                            event = future.result()
+                            if event.returncode != 0:
+                                print(f'{event.task} failed with exit status '
+                                      f'{event.returncode}', flush=True)
+                                tail = self.logs \
+                                    and self.logs.get_tail(event.task)
+                                if tail:
+                                    print(tail.decode(errors='replace'),
+                                          flush=True)
+                            run.end(event.task, event.start, event.end,
+                                    event.returncode)
+                            events.put_nowait(event)
+                finally:
+                    for future in running:
+                        future.cancel()
+                    if running:
+                        await asyncio.wait(running)
+
+            if run.aborted:
+                raise EarlyAbortError()
+
+        dispatcher = asyncio.ensure_future(dispatch())
+        # None marks the end of the events
+        dispatcher.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            event = await events.get()
+            while event is not None:
+                yield event
+                event = await events.get()
+            # raise whatever stopped the run
+            await dispatcher
+        finally:
+            if not dispatcher.done():
+                dispatcher.cancel()
+                # wait for the running tasks to be killed
+                await asyncio.wait([dispatcher])
+
+
+    async def run_tasks_async(self, error_handling: str = 'soft',
+                              max_workers: int = 8, **kwargs) -> None:
+        """Run all tasks on the DAG without blocking the event loop.
+
+        See iter_tasks_async for the arguments.
+
+        Example:
+            >>> import asyncio
+            >>> asyncio.run(dq.run_tasks_async(max_workers=4))
+        """
+        async for _ in self.iter_tasks_async(error_handling, max_workers,
+                                             **kwargs):
+            pass
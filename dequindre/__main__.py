@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Command line interface.
+
+    $ dequindre worker --host coordinator.example.com --port 8765 --slots 4
+
+See dequindre.distributed.
+"""
+
+import argparse
+
+from dequindre.distributed import Worker
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(prog='dequindre')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    worker = commands.add_parser(
+        'worker', help="run tasks sent by a dequindre coordinator")
+    worker.add_argument('--host', required=True,
+                        help="the coordinator's host")
+    worker.add_argument('--port', type=int, required=True,
+                        help="the coordinator's port")
+    worker.add_argument('--slots', type=int, default=1,
+                        help="how many tasks may run at once")
+    worker.add_argument('--heartbeat-interval', type=float, default=2.0,
+                        help="seconds between heartbeats")
+    worker.add_argument('--name', help="defaults to the hostname")
+
+    args = parser.parse_args(argv)
+    if args.command == 'worker':
+        Worker(args.host, args.port, slots=args.slots,
+               heartbeat_interval=args.heartbeat_interval,
+               name=args.name).run()
+
+
+if __name__ == '__main__':
+    main()
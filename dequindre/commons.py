@@ -11,7 +11,7 @@ from contextlib import contextmanager
 from os.path import join as pathjoin
 from typing import Callable
 
-from dequindre import Task
+from dequindre import Task, EnvLimit
 
 
 @contextmanager
@@ -46,9 +46,45 @@ def common_task(loc_pattern: str, common_env: str = 'python'):
     yield construct_task
 
 
+class _EnvFactory:
+    """Build env paths with a common prefix and suffix.
+
+    Attributes:
+        limits (`dict` of `str`: `EnvLimit`): The limits of every env built
+            so far, ready to pass to Dequindre as env_limits.
+    """
+    def __init__(self, common_prefix: str, common_suffix: str,
+                 max_concurrency: int = None, max_launch_rate: float = None):
+        self.common_prefix = common_prefix
+        self.common_suffix = common_suffix
+        self.default_limit = EnvLimit(max_concurrency, max_launch_rate)
+        self.limits = {}
+
+
+    def __call__(self, env_name: str, *, max_concurrency: int = None,
+                 max_launch_rate: float = None) -> str:
+        """Return the path to an env's python.
+
+        Limits given here replace the factory's own for this env.
+        """
+        env = pathjoin(self.common_prefix, env_name, self.common_suffix)
+        limit = EnvLimit(
+            self.default_limit.max_concurrency if max_concurrency is None
+            else max_concurrency,
+            self.default_limit.max_launch_rate if max_launch_rate is None
+            else max_launch_rate)
+        if limit != EnvLimit():
+            self.limits[env] = limit
+
+        return env
+
+
 @contextmanager
 def common_venv(common_prefix: str = '.',
-                common_suffix: str = None) \
+                common_suffix: str = None,
+                *,
+                max_concurrency: int = None,
+                max_launch_rate: float = None) \
                 -> Callable:
     """Quickly construct a path to a common virtualenv environment
 
@@ -57,9 +93,14 @@ def common_venv(common_prefix: str = '.',
     Args:
         common_prefix (str): The file path before the environment name.
         common_suffix (str, optional): The file path after the environment name.
+        max_concurrency (int, optional): How many tasks with each env may
+            run at once. Keyword only.
+        max_launch_rate (float, optional): How many tasks with each env may
+            start per second. Keyword only.
 
     Returns:
-        Function to shorten env specification
+        Function to shorten env specification. It takes the same limits,
+        per env, and collects them in its limits attribute.
 
     Example:
         >>> #doctest: +SKIP
@@ -73,12 +114,16 @@ def common_venv(common_prefix: str = '.',
     """
     if common_suffix is None:
         common_suffix = pathjoin('Scripts', 'python')
-    yield lambda s: pathjoin(common_prefix, s, common_suffix)
+    yield _EnvFactory(common_prefix, common_suffix, max_concurrency,
+                      max_launch_rate)
 
 
 @contextmanager
 def common_pipenv(common_prefix: str = '.',
-                  common_suffix: str = None) \
+                  common_suffix: str = None,
+                  *,
+                  max_concurrency: int = None,
+                  max_launch_rate: float = None) \
                   -> Callable:
     """Quickly construct a path to a common pipenv environment
 
@@ -87,9 +132,14 @@ def common_pipenv(common_prefix: str = '.',
     Args:
         common_prefix (str): The file path before the environment name.
         common_suffix (str, optional): The file path after the environment name.
+        max_concurrency (int, optional): How many tasks with each env may
+            run at once. Keyword only.
+        max_launch_rate (float, optional): How many tasks with each env may
+            start per second. Keyword only.
 
     Returns:
-        Function to shorten env specification
+        Function to shorten env specification. It takes the same limits,
+        per env, and collects them in its limits attribute.
 
     Example:
         >>> #doctest: +SKIP
@@ -103,12 +153,16 @@ def common_pipenv(common_prefix: str = '.',
     """
     if common_suffix is None:
         common_suffix = pathjoin('Scripts', 'python')
-    yield lambda s: pathjoin(common_prefix, s, common_suffix)
+    yield _EnvFactory(common_prefix, common_suffix, max_concurrency,
+                      max_launch_rate)
 
 
 @contextmanager
 def common_conda_env(common_prefix: str,
-                     common_suffix: str = None) \
+                     common_suffix: str = None,
+                     *,
+                     max_concurrency: int = None,
+                     max_launch_rate: float = None) \
                      -> Callable:
     """Quickly construct a path to a common conda environment
 
@@ -117,9 +171,14 @@ def common_conda_env(common_prefix: str,
     Args:
         common_prefix (str): The file path before the environment name.
         common_suffix (str, optional): The file path after the environment name.
+        max_concurrency (int, optional): How many tasks with each env may
+            run at once. Keyword only.
+        max_launch_rate (float, optional): How many tasks with each env may
+            start per second. Keyword only.
 
     Returns:
-        Function to shorten env specification
+        Function to shorten env specification. It takes the same limits,
+        per env, and collects them in its limits attribute.
 
     Example:
         >>> #doctest: +SKIP
@@ -130,7 +189,16 @@ def common_conda_env(common_prefix: str,
         ...
         >>> python27
         '/path/to/conda/envs/python27/bin/python'
+
+        Limit how many tasks in a shared env start at once:
+
+        >>> with common_conda_env('/shared/conda/envs',
+        ...                       max_concurrency=2) as env:
+        ...     python36 = env('python36')
+        ...
+        >>> dq = Dequindre(dag, env_limits=env.limits)
     """
     if common_suffix is None:
         common_suffix = pathjoin('bin', 'python')
-    yield lambda s: pathjoin(common_prefix, s, common_suffix)
+    yield _EnvFactory(common_prefix, common_suffix, max_concurrency,
+                      max_launch_rate)
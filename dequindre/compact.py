@@ -0,0 +1,614 @@
+# -*- coding: utf-8 -*-
+"""A compact, read-only DAG for very large graphs.
+
+A DAG keeps every Task as an object, and every edge twice, in dicts of sets.
+That costs around a kilobyte per task, so a million-task DAG needs about a
+gigabyte before anything runs. A CompactDAG numbers its tasks 0 to n - 1 in
+topological order and keeps the edges as compressed sparse row (CSR) arrays
+of task numbers. Locs and envs are kept once, in a string table. Task
+objects are only made when they're asked for.
+
+Because tasks are numbered in topological order, every edge goes from a
+lower number to a higher one. Traversals are tight loops over arrays, and
+priority levels take a single pass. With numpy installed, priority levels
+are found a whole level at a time instead, which is several times faster
+on wide DAGs.
+
+A CompactDAG is read-only. Build a DAG, or load a snapshot, then compact it.
+It has the query methods that Dequindre uses, so a Dequindre can schedule
+one just like a DAG.
+"""
+
+from array import array
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Set
+
+from dequindre import Task, DAG
+from dequindre.exceptions import CyclicGraphError
+
+try:
+    import numpy
+except ImportError:  # numpy is optional; levels are found in pure Python
+    numpy = None
+
+
+# typecode of unsigned 4 byte ints
+_U32 = next(c for c in 'IL' if array(c).itemsize == 4)
+# shared by every Task that's built with only a loc and env
+_EMPTY = MappingProxyType({})
+
+
+# levels with fewer tasks than this are cheaper to step through in Python
+# than with a handful of numpy calls
+_MIN_VECTOR_WIDTH = 64
+
+
+def _get_levels_vectorized(offsets, targets) -> array:
+    """Find priority levels on a CSR graph of task numbers with numpy.
+
+    Kahn's algorithm, one whole level at a time: gather every edge out of
+    the level, count how many of them point at each task, and subtract the
+    counts from the in-degrees. Tasks that reach zero are the next level.
+
+    Args:
+        offsets: Where each task's downstream numbers start in targets,
+            plus the end of the last one.
+        targets: Downstream task numbers.
+
+    Returns:
+        `array` of int: Each task's level, by number. Sources are level 1.
+        Tasks on a cycle are left at level 0.
+    """
+    # narrow levels step through plain arrays, which are much quicker to
+    # index one item at a time, and wide levels work on numpy views of them
+    offset_list, target_list = offsets, targets
+    offsets = numpy.asarray(offsets, dtype=numpy.intp)
+    targets = numpy.asarray(targets, dtype=numpy.intp)
+    n = len(offsets) - 1
+    waiting_on = array('q', [0]) * n
+    levels = array('q', [0]) * n
+    waiting_on_view = numpy.frombuffer(waiting_on, dtype=numpy.int64)
+    levels_view = numpy.frombuffer(levels, dtype=numpy.int64)
+    waiting_on_view[:] = numpy.bincount(targets, minlength=n)
+    level = numpy.flatnonzero(waiting_on_view == 0).tolist()
+    i = 1
+
+    while len(level):
+        if len(level) < _MIN_VECTOR_WIDTH:
+            next_level = []
+            for u in level:
+                levels[u] = i
+                for v in target_list[offset_list[u]:offset_list[u + 1]]:
+                    waiting_on[v] -= 1
+                    if waiting_on[v] == 0:
+                        next_level.append(v)
+            level = next_level
+        else:
+            level = numpy.asarray(level, dtype=numpy.intp)
+            levels_view[level] = i
+            starts = offsets[level]
+            counts = offsets[level + 1] - starts
+            # the positions in targets of every edge out of the level
+            ends = numpy.cumsum(counts)
+            edges = numpy.arange(ends[-1]) \
+                + numpy.repeat(starts - ends + counts, counts)
+            children, decrements = numpy.unique(targets[edges],
+                                                return_counts=True)
+            waiting_on_view[children] -= decrements
+            level = children[waiting_on_view[children] == 0]
+        i += 1
+
+    return levels
+
+
+def _has_extras(task: Task) -> bool:
+    """Whether a Task has fields other than its loc and env"""
+    return bool(task.inputs or task.outputs or task.args or task.environ
+                or task.cwd is not None or task.resources)
+
+
+class CompactDAG:
+    """A read-only DAG of integer task numbers and CSR edge arrays.
+
+    Example:
+        >>> from dequindre import DAG, Dequindre
+        >>> from dequindre.compact import CompactDAG
+        >>> dag = CompactDAG.load('./nightly.dag')
+        >>> dq = Dequindre(dag)
+        >>> dq.get_schedules()
+    """
+    def __init__(self, dag: DAG):
+        """Compact a DAG.
+
+        Args:
+            dag (`DAG`): The DAG to compact. It isn't changed.
+        """
+        assert isinstance(dag, DAG), '`dag` must be a DAG'
+
+        order = dag.get_topological_order()
+        numbers = {t: i for i, t in enumerate(order)}
+        strings, string_ids = [], {}
+
+        def intern(s):
+            i = string_ids.get(s)
+            if i is None:
+                i = string_ids[s] = len(strings)
+                strings.append(s)
+            return i
+
+        offsets = array(_U32, [0])
+        targets = array(_U32)
+        for t in order:
+            targets.extend(sorted(numbers[d] for d in dag._edges.get(t, ())))
+            offsets.append(len(targets))
+
+        self._build(
+            strings,
+            array(_U32, [intern(t.loc) for t in order]),
+            array(_U32, [intern(t.env) for t in order]),
+            {i: t for i, t in enumerate(order) if _has_extras(t)},
+            offsets, targets)
+
+
+    @classmethod
+    def load(cls, path: str, use_mmap: bool = False) -> 'CompactDAG':
+        """Load a CompactDAG from a snapshot written by DAG.save.
+
+        Unlike DAG.load, only Tasks with fields other than loc and env are
+        built, so the whole DAG never has to fit in memory as objects.
+
+        Args:
+            path (str): Location of the snapshot file.
+            use_mmap (bool, optional): Map the file into memory instead of
+                reading it all at once.
+
+        Raises:
+            ValueError: The file isn't a DAG snapshot.
+            CyclicGraphError: The snapshot has been tampered with.
+
+        Returns:
+            `CompactDAG`
+        """
+        from dequindre import snapshots
+
+        return snapshots._load(path, use_mmap, cls._from_snapshot)
+
+
+    @classmethod
+    def _from_snapshot(cls, buffer, path: str) -> 'CompactDAG':
+        from dequindre import snapshots
+
+        snapshot = snapshots._read_snapshot(buffer, path)
+        n = len(snapshot['locs'])
+
+        # Kahn's algorithm on the snapshot's numbers
+        offsets, targets = snapshot['downstream']
+        offsets, targets = offsets.tolist(), targets.tolist()
+        up_offsets = snapshot['upstream'][0]
+        waiting_on = [up_offsets[i + 1] - up_offsets[i] for i in range(n)]
+        order = [i for i in range(n) if waiting_on[i] == 0]
+        for u in order:
+            for v in targets[offsets[u]:offsets[u + 1]]:
+                waiting_on[v] -= 1
+                if waiting_on[v] == 0:
+                    order.append(v)
+        if len(order) != n:
+            raise CyclicGraphError(f'{path} has no topological order')
+
+        # only build the Tasks that have more than a loc and env
+        extras = set(i for i in range(n) if snapshot['cwds'][i])
+        for field in ('inputs', 'outputs', 'args', 'environ', 'resources'):
+            field_offsets = snapshot[field][0]
+            extras.update(i for i in range(n)
+                          if field_offsets[i] != field_offsets[i + 1])
+        extras = sorted(extras)
+        extra_tasks = dict(zip(extras, snapshots._make_tasks(snapshot,
+                                                             extras)))
+
+        numbers = [0] * n
+        for new, old in enumerate(order):
+            numbers[old] = new
+        new_offsets = array(_U32, [0])
+        new_targets = array(_U32)
+        for old in order:
+            new_targets.extend(sorted(
+                numbers[v] for v in targets[offsets[old]:offsets[old + 1]]))
+            new_offsets.append(len(new_targets))
+
+        locs, envs = snapshot['locs'], snapshot['envs']
+        compact = cls.__new__(cls)
+        compact._build(
+            snapshot['strings'],
+            array(_U32, [locs[old] for old in order]),
+            array(_U32, [envs[old] for old in order]),
+            {numbers[old]: t for old, t in extra_tasks.items()},
+            new_offsets, new_targets)
+
+        return compact
+
+
+    def _build(self, strings: List[str], locs: array, envs: array,
+               extras: Dict[int, Task], offsets: array,
+               targets: array) -> None:
+        """Set up a CompactDAG whose tasks are numbered in topological order.
+
+        Args:
+            strings (`list` of `str`): The string table.
+            locs (`array`): String ids of each task's loc.
+            envs (`array`): String ids of each task's env.
+            extras (`dict` of `int`: `Task`): Tasks with fields other than
+                loc and env, by number.
+            offsets (`array`): Where each task's downstream tasks start in
+                targets. Has n + 1 items.
+            targets (`array`): Numbers of downstream tasks.
+        """
+        n = len(locs)
+        self._strings = strings
+        self._locs = locs
+        self._envs = envs
+        self._extras = extras
+        self._down_offsets = offsets
+        self._down_targets = targets
+
+        # the upstream CSR, by counting sort of the edges' targets
+        counts = [0] * (n + 1)
+        for v in targets:
+            counts[v + 1] += 1
+        for i in range(n):
+            counts[i + 1] += counts[i]
+        up_offsets = array(_U32, counts)
+        up_targets = array(_U32, bytes(len(targets) * 4))
+        for u in range(n):
+            for v in targets[offsets[u]:offsets[u + 1]]:
+                up_targets[counts[v]] = u
+                counts[v] += 1
+        self._up_offsets = up_offsets
+        self._up_targets = up_targets
+
+        # look tasks up by loc; a list when more than one env shares it
+        index = {}
+        for i, loc_id in enumerate(locs):
+            loc = strings[loc_id]
+            found = index.get(loc)
+            if found is None:
+                index[loc] = i
+            elif isinstance(found, list):
+                found.append(i)
+            else:
+                index[loc] = [found, i]
+        self._index = index
+
+
+    def __repr__(self):
+        return f"{CompactDAG.__qualname__}({len(self)} tasks)"
+
+
+    def __len__(self):
+        return len(self._locs)
+
+
+    def __contains__(self, task: Task) -> bool:
+        return self._find(task) is not None
+
+
+    def copy(self) -> 'CompactDAG':
+        """CompactDAGs are read-only, so there's nothing to copy"""
+        return self
+
+
+    def __copy__(self):
+        return self
+
+
+    def __deepcopy__(self, memo):
+        """CompactDAGs are read-only, so there's nothing to copy"""
+        return self
+
+    # ------------------------------------------------------------------------
+    # Task numbers
+    # ------------------------------------------------------------------------
+
+    def _find(self, task: Task):
+        found = self._index.get(task.loc)
+        if found is None:
+            return None
+        for i in (found if isinstance(found, list) else (found,)):
+            if self._strings[self._envs[i]] == task.env:
+                return i
+
+        return None
+
+
+    def get_number(self, task: Task) -> int:
+        """Return a task's number. Tasks are numbered in topological order.
+
+        Raises:
+            KeyError: The task isn't in the DAG.
+        """
+        i = self._find(task)
+        if i is None:
+            raise KeyError(task)
+
+        return i
+
+
+    def get_task(self, number: int) -> Task:
+        """Return the Task with a number."""
+        task = self._extras.get(number)
+        if task is not None:
+            return task
+
+        return Task._from_fields(self._strings[self._locs[number]],
+                                 self._strings[self._envs[number]],
+                                 (), (), (), _EMPTY, None, _EMPTY)
+
+
+    def _get_tasks(self, numbers: Iterable[int]) -> Set[Task]:
+        return set(map(self.get_task, numbers))
+
+
+    def _numbers(self, tasks) -> List[int]:
+        if isinstance(tasks, Task):
+            tasks = {tasks}
+
+        return [self.get_number(t) for t in tasks]
+
+
+    def get_downstream_numbers(self, number: int) -> array:
+        """Return the numbers of the tasks that directly depend on a task"""
+        offsets = self._down_offsets
+        return self._down_targets[offsets[number]:offsets[number + 1]]
+
+
+    def get_upstream_numbers(self, number: int) -> array:
+        """Return the numbers of the tasks a task directly depends on"""
+        offsets = self._up_offsets
+        return self._up_targets[offsets[number]:offsets[number + 1]]
+
+    # ------------------------------------------------------------------------
+    # Graph Utilities
+    # ------------------------------------------------------------------------
+
+    @property
+    def tasks(self) -> Set[Task]:
+        """Every Task. They're built each time, so keep the result."""
+        return self._get_tasks(range(len(self)))
+
+
+    def get_downstream(self) -> dict:
+        """Return adjacency dict of downstream Tasks.
+
+        Returns:
+            `dict` of `Task`: `set` of `Task`
+        """
+        return {self.get_task(i): self._get_tasks(
+                    self.get_downstream_numbers(i))
+                for i in range(len(self)) if self.get_out_degree_number(i)}
+
+
+    def get_upstream(self) -> dict:
+        """Return adjacency dict of upstream Tasks.
+
+        Returns:
+            `dict` of `Task`: `set` of `Task`
+        """
+        return {self.get_task(i): self._get_tasks(
+                    self.get_upstream_numbers(i))
+                for i in range(len(self)) if self.get_in_degree_number(i)}
+
+
+    def get_task_downstream(self, task: Task) -> set:
+        """Return the set of Tasks that directly depend on task"""
+        i = self._find(task)
+        if i is None:
+            return set()
+
+        return self._get_tasks(self.get_downstream_numbers(i))
+
+
+    def get_task_upstream(self, task: Task) -> set:
+        """Return the set of Tasks that task directly depends on"""
+        i = self._find(task)
+        if i is None:
+            return set()
+
+        return self._get_tasks(self.get_upstream_numbers(i))
+
+
+    def get_in_degree_number(self, number: int) -> int:
+        return self._up_offsets[number + 1] - self._up_offsets[number]
+
+
+    def get_out_degree_number(self, number: int) -> int:
+        return self._down_offsets[number + 1] - self._down_offsets[number]
+
+
+    def get_in_degree(self, task: Task) -> int:
+        """Return the number of Tasks that task directly depends on"""
+        i = self._find(task)
+        return 0 if i is None else self.get_in_degree_number(i)
+
+
+    def get_out_degree(self, task: Task) -> int:
+        """Return the number of Tasks that directly depend on task"""
+        i = self._find(task)
+        return 0 if i is None else self.get_out_degree_number(i)
+
+
+    def get_sources(self) -> set:
+        """Return the set of source Tasks (Tasks with no upstream dependencies)"""
+        offsets = self._up_offsets
+        return self._get_tasks(i for i in range(len(self))
+                               if offsets[i] == offsets[i + 1])
+
+
+    def get_sinks(self) -> set:
+        """Return the set of sink Tasks (Tasks with no downstream dependencies)"""
+        offsets = self._down_offsets
+        return self._get_tasks(i for i in range(len(self))
+                               if offsets[i] == offsets[i + 1])
+
+
+    def _get_closure(self, numbers: List[int], offsets: array,
+                     targets: array) -> Set[int]:
+        seen = set()
+        stack = list(numbers)
+        while stack:
+            i = stack.pop()
+            for j in targets[offsets[i]:offsets[i + 1]]:
+                if j not in seen:
+                    seen.add(j)
+                    stack.append(j)
+
+        return seen
+
+
+    def ancestors(self, tasks) -> set:
+        """Return every Task that tasks depend on, directly or not.
+
+        Args:
+            tasks (`Task` or `set` of `Task`): Tasks in the DAG.
+
+        Returns:
+            `set` of `Task`
+        """
+        return self._get_tasks(self._get_closure(
+            self._numbers(tasks), self._up_offsets, self._up_targets))
+
+
+    def descendants(self, tasks) -> set:
+        """Return every Task that depends on tasks, directly or not.
+
+        Args:
+            tasks (`Task` or `set` of `Task`): Tasks in the DAG.
+
+        Returns:
+            `set` of `Task`
+        """
+        return self._get_tasks(self._get_closure(
+            self._numbers(tasks), self._down_offsets, self._down_targets))
+
+
+    def subdag(self, tasks, include_upstream: bool = False,
+               include_downstream: bool = False) -> DAG:
+        """Return a new DAG of some tasks and the dependencies between them.
+
+        See DAG.subdag. The result is a plain, mutable DAG.
+
+        Args:
+            tasks (`Task` or `set` of `Task`): Tasks in the DAG.
+            include_upstream (bool, optional): Also include every task that
+                tasks depend on.
+            include_downstream (bool, optional): Also include every task
+                that depends on tasks.
+
+        Returns:
+            `DAG`
+        """
+        if isinstance(tasks, Task):
+            tasks = {tasks}
+        assert all(t in self for t in tasks), '`tasks` must be in the DAG'
+
+        numbers = self._numbers(tasks)
+        selected = set(numbers)
+        if include_upstream:
+            selected |= self._get_closure(numbers, self._up_offsets,
+                                          self._up_targets)
+        if include_downstream:
+            selected |= self._get_closure(numbers, self._down_offsets,
+                                          self._down_targets)
+
+        # part of a DAG can't have cycles, so skip the checks
+        selected_tasks = {i: self.get_task(i) for i in selected}
+        subdag = DAG()
+        subdag.add_tasks(set(selected_tasks.values()))
+        offsets, targets = self._down_offsets, self._down_targets
+        for u in selected:
+            # keep dependencies that go through tasks that were left out
+            seen = set()
+            stack = [u]
+            while stack:
+                i = stack.pop()
+                for v in targets[offsets[i]:offsets[i + 1]]:
+                    if v in seen:
+                        continue
+                    seen.add(v)
+                    if v in selected:
+                        subdag._add_edge(selected_tasks[u], selected_tasks[v])
+                    else:
+                        stack.append(v)
+
+        return subdag
+
+
+    def is_cyclic(self) -> bool:
+        """A CompactDAG is always acyclic. It's checked when it's built."""
+        return False
+
+
+    def get_topological_order(self) -> list:
+        """Return every Task, each one after all of its upstream Tasks.
+
+        Returns:
+            `list` of `Task`
+        """
+        return [self.get_task(i) for i in range(len(self))]
+
+
+    def get_levels(self, use_numpy: bool = None) -> array:
+        """Return each task's priority level, by number.
+
+        A task's level is one more than the highest level of its upstream
+        tasks, and sources are level 1, as in Dequindre.get_task_schedules.
+
+        The levels are found a whole level at a time with numpy when it's
+        installed, and in one pass over the task numbers when it isn't.
+
+        Args:
+            use_numpy (bool, optional): Force one way or the other, e.g. to
+                compare them. By default numpy is used if it's installed.
+
+        Returns:
+            `array` of int
+        """
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        assert not use_numpy or numpy is not None, \
+            '`use_numpy` requires numpy to be installed'
+
+        n = len(self)
+        if use_numpy:
+            return _get_levels_vectorized(self._down_offsets,
+                                          self._down_targets)
+
+        levels = array(_U32, [1]) * n
+        offsets, targets = self._down_offsets, self._down_targets
+        # every edge goes forward, so one pass in number order is enough
+        for u in range(n):
+            next_level = levels[u] + 1
+            for v in targets[offsets[u]:offsets[u + 1]]:
+                if levels[v] < next_level:
+                    levels[v] = next_level
+
+        return levels
+
+
+    def get_task_levels(self) -> Dict[Task, int]:
+        """Return each Task's priority level. See get_levels.
+
+        Returns:
+            `dict` of `Task`: `int`
+        """
+        return dict(zip(self.get_topological_order(), self.get_levels()))
+
+
+    def to_dag(self) -> DAG:
+        """Build a mutable DAG with the same tasks and dependencies."""
+        tasks = self.get_topological_order()
+        dag = DAG()
+        dag.add_tasks(set(tasks))
+        for u, task in enumerate(tasks):
+            for v in self.get_downstream_numbers(u):
+                dag._add_edge(task, tasks[v])
+
+        return dag
@@ -0,0 +1,446 @@
+# -*- coding: utf-8 -*-
+"""Run tasks on many hosts.
+
+A Coordinator holds the DAG and listens for workers over TCP. Each worker is
+a `dequindre worker` process that says how many tasks it can run at once.
+The coordinator sends ready tasks to workers with free slots, and workers
+send back each task's exit status when it ends.
+
+Workers send a heartbeat every few seconds. When a worker disconnects, or
+misses its heartbeats for too long, the coordinator gives its tasks to
+other workers.
+
+Messages are single lines of JSON. Tasks are sent with all of their fields,
+so every host must see the same paths for locs, envs, inputs, and outputs.
+
+A worker that sends a message the coordinator can't read is disconnected,
+and its tasks are given to other workers.
+
+Note:
+    The protocol isn't authenticated. Only listen on trusted networks.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+from queue import Queue, Empty
+import socket
+from subprocess import Popen
+from threading import Event, Lock, Thread
+import time
+from typing import Dict, List, Set
+
+from dequindre import Task, Dequindre, TaskEvent
+from dequindre import _Dispatcher, _get_popen_kwargs, _wait_with_rusage
+from dequindre.exceptions import EarlyAbortError
+
+
+def _task_to_dict(task: Task) -> dict:
+    return {
+        'loc': task.loc,
+        'env': task.env,
+        'inputs': list(task.inputs),
+        'outputs': list(task.outputs),
+        'args': list(task.args),
+        'environ': dict(task.environ),
+        'cwd': task.cwd,
+        'resources': dict(task.resources),
+    }
+
+
+def _task_from_dict(data: dict) -> Task:
+    return Task(**data)
+
+
+def _send(sock: socket.socket, message: dict) -> None:
+    sock.sendall((json.dumps(message) + '\n').encode())
+
+
+def _disconnect(sock: socket.socket) -> None:
+    # shut down first, or the reading thread's file keeps the socket open
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    sock.close()
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_time(value) -> bool:
+    return _is_int(value) or isinstance(value, float)
+
+
+def _is_valid(message) -> bool:
+    """Whether a message from a worker has every field its type needs"""
+    if not isinstance(message, dict):
+        return False
+
+    kind = message.get('type')
+    if kind == 'hello':
+        return isinstance(message.get('name'), str) \
+            and _is_int(message.get('slots')) and message['slots'] >= 1
+    if kind == 'heartbeat':
+        return True
+    if kind == 'result':
+        returncode = message.get('returncode')
+        return _is_int(message.get('id')) \
+            and (returncode is None or _is_int(returncode)) \
+            and _is_time(message.get('start')) \
+            and _is_time(message.get('end'))
+
+    return False
+
+
+class _RemoteWorker:
+    """The coordinator's view of one connected worker."""
+
+    def __init__(self, sock: socket.socket, name: str, slots: int):
+        self.sock = sock
+        self.name = name
+        self.slots = slots
+        # the tasks it's running, by assignment id
+        self.assigned = {}
+        self.last_seen = time.monotonic()
+
+
+    def __repr__(self):
+        return f"{_RemoteWorker.__qualname__}({self.name})"
+
+
+class Coordinator:
+    """Dispatch a Dequindre's tasks to workers over TCP.
+
+    Workers can connect as soon as the coordinator is created, and stay
+    connected until it's closed, so one set of workers can serve many runs.
+
+    Example:
+        >>> from dequindre import Task, DAG, Dequindre
+        >>> from dequindre.distributed import Coordinator
+        >>> boil_water = Task('/shared/tea-tasks/boil_water.py')
+        >>> dq = Dequindre(DAG(tasks={boil_water}))
+        >>> with Coordinator(dq, host='0.0.0.0', port=8765) as coordinator:
+        ...     coordinator.run_tasks()
+
+        Then, on each worker host:
+
+        $ dequindre worker --host coordinator.example.com --port 8765
+
+    Attributes:
+        dequindre (`Dequindre`): The scheduler whose DAG is run.
+        address (`tuple` of `str`, `int`): The host and port the coordinator
+            listens on.
+        heartbeat_timeout (float): Seconds without a message from a worker
+            before its tasks are given to other workers.
+    """
+    def __init__(self, dequindre: Dequindre, host: str = '127.0.0.1',
+                 port: int = 0, heartbeat_timeout: float = 10.0):
+        """Init a Coordinator and start listening for workers.
+
+        Args:
+            dequindre (`Dequindre`): The scheduler whose DAG is run.
+            host (str, optional): The interface to listen on.
+            port (int, optional): The port to listen on. 0 picks a free
+                port; see the address attribute.
+            heartbeat_timeout (float, optional): Seconds without a message
+                from a worker before its tasks are given to other workers.
+        """
+        assert isinstance(dequindre, Dequindre), \
+            '`dequindre` must be a Dequindre'
+        assert heartbeat_timeout > 0, '`heartbeat_timeout` must be positive'
+
+        self.dequindre = dequindre
+        self.heartbeat_timeout = heartbeat_timeout
+        self._workers = {}
+        # (kind, socket, message) from the connection threads
+        self._events = Queue()
+        self._closed = Event()
+
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((host, port))
+        self._server.listen()
+        self.address = self._server.getsockname()[:2]
+        Thread(target=self._accept, daemon=True).start()
+
+
+    def __repr__(self):
+        return f"{Coordinator.__qualname__}({self.address})"
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def _accept(self) -> None:
+        """Start a thread to read from each worker that connects"""
+        while not self._closed.is_set():
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                return None
+            Thread(target=self._read, args=(sock,), daemon=True).start()
+
+
+    def _read(self, sock: socket.socket) -> None:
+        """Pass a worker's messages to the coordinator until it's gone"""
+        try:
+            with sock.makefile('rb') as ifile:
+                for line in ifile:
+                    self._events.put(('message', sock, json.loads(line)))
+        except (OSError, ValueError):
+            pass
+        self._events.put(('lost', sock, None))
+
+
+    def _lose(self, worker: _RemoteWorker, run: _Dispatcher) -> None:
+        """Forget a worker and put its tasks back in the ready queue"""
+        del self._workers[worker.sock]
+        _disconnect(worker.sock)
+        for task in worker.assigned.values():
+            print(f'\nReassigning {repr(task)} from {worker.name}\n',
+                  flush=True)
+            run.requeue(task)
+        worker.assigned.clear()
+
+
+    def run_tasks(self, error_handling: str = 'soft',
+                  durations: Dict[Task, float] = None,
+                  history=None,
+                  checkpoint: str = None,
+                  resume: bool = False,
+                  fingerprints=None,
+                  capacity: Dict[str, float] = None,
+                  only: Set[Task] = None,
+                  include_upstream: bool = False,
+                  include_downstream: bool = False) -> List[TaskEvent]:
+        """Run all tasks on the DAG on the connected workers.
+
+        Tasks are dispatched like Dequindre.run_tasks: as soon as their
+        upstream tasks are complete, longest critical path first, within
+        the capacity and the Dequindre's env_limits. The run waits for
+        workers if none are connected.
+
+        Args:
+            error_handling (str): Either 'soft' or 'hard'. 'hard' error
+                handling will abort the schedule after the first error.
+            durations (`dict` of `Task`: `float`, optional): Expected task
+                durations used to rank ready tasks. See
+                Dequindre.get_critical_paths.
+            capacity (`dict` of `str`: `float`, optional): How much of each
+                resource the running tasks may use in total, across every
+                worker. See Dequindre.run_tasks.
+            history, checkpoint, resume, fingerprints, only,
+            include_upstream, include_downstream: See Dequindre.run_tasks.
+                Checkpoints, history, and fingerprints are kept by the
+                coordinator.
+
+        Raises:
+            EarlyAbortError: A task failed under 'hard' error handling. It's
+                raised after every running task has ended.
+
+        Returns:
+            `list` of `TaskEvent`: One event per task that ran, in the order
+            they ended.
+        """
+        events = []
+        next_id = 0
+
+        def is_running():
+            return any(w.assigned for w in self._workers.values())
+
+        with _Dispatcher(self.dequindre, error_handling, durations, history,
+                         checkpoint, resume, fingerprints, capacity, only,
+                         include_upstream, include_downstream) as run:
+            while (run.ready and not run.aborted) or is_running():
+                # fill every free slot, busiest workers last
+                timeout = self.heartbeat_timeout / 4
+                for worker in sorted(self._workers.values(),
+                                     key=lambda w: len(w.assigned) / w.slots):
+                    def can_start(worker=worker):
+                        return worker.sock in self._workers \
+                            and len(worker.assigned) < worker.slots
+
+                    for task in run.start(can_start):
+                        next_id += 1
+                        worker.assigned[next_id] = task
+                        print(f'\nSending {repr(task)} to {worker.name}\n',
+                              flush=True)
+                        try:
+                            _send(worker.sock, {'type': 'task', 'id': next_id,
+                                                'task': _task_to_dict(task)})
+                        except OSError:
+                            self._lose(worker, run)
+                    if run.timeout is not None:
+                        timeout = min(timeout, run.timeout)
+
+                try:
+                    received = [self._events.get(timeout=timeout)]
+                except Empty:
+                    received = []
+                # handle everything that's queued before checking heartbeats
+                while not self._events.empty():
+                    received.append(self._events.get())
+
+                for kind, sock, message in received:
+                    worker = self._workers.get(sock)
+                    valid = kind == 'message' and _is_valid(message)
+                    if worker is None:
+                        if valid and message['type'] == 'hello':
+                            worker = _RemoteWorker(sock, message['name'],
+                                                   message['slots'])
+                            self._workers[sock] = worker
+                            print(f'\n{worker.name} joined with '
+                                  f'{worker.slots} slots\n', flush=True)
+                        else:
+                            # a worker that's already gone, or that didn't
+                            # say hello first
+                            _disconnect(sock)
+                        continue
+
+                    if kind == 'lost':
+                        self._lose(worker, run)
+                        continue
+                    if not valid or message['type'] == 'hello':
+                        print(f'\n{worker.name} sent a bad message: '
+                              f'{message!r}\n', flush=True)
+                        self._lose(worker, run)
+                        continue
+
+                    worker.last_seen = time.monotonic()
+                    if message['type'] == 'result':
+                        task = worker.assigned.pop(message['id'], None)
+                        if task is None:
+                            continue
+
+                        event = TaskEvent(task, message['returncode'],
+                                          message['start'], message['end'])
+                        events.append(event)
+                        if event.returncode != 0:
+                            print(f'{task} failed with exit status '
+                                  f'{event.returncode} on {worker.name}',
+                                  flush=True)
+                        run.end(task, event.start, event.end,
+                                event.returncode)
+
+                now = time.monotonic()
+                for worker in list(self._workers.values()):
+                    if now - worker.last_seen > self.heartbeat_timeout:
+                        print(f'\n{worker.name} missed its heartbeats\n',
+                              flush=True)
+                        self._lose(worker, run)
+
+        if run.aborted:
+            raise EarlyAbortError()
+
+        return events
+
+
+    def close(self) -> None:
+        """Stop listening, and tell every worker to shut down."""
+        self._closed.set()
+        self._server.close()
+        for worker in list(self._workers.values()):
+            try:
+                _send(worker.sock, {'type': 'shutdown'})
+                worker.sock.close()
+            except OSError:
+                pass
+        self._workers.clear()
+
+
+class Worker:
+    """Run the tasks a Coordinator sends.
+
+    Example:
+        >>> from dequindre.distributed import Worker
+        >>> Worker('coordinator.example.com', 8765, slots=4).run()
+
+    Attributes:
+        address (`tuple` of `str`, `int`): The coordinator's host and port.
+        slots (int): How many tasks may run at once.
+        heartbeat_interval (float): Seconds between heartbeats.
+        name (str): How the coordinator refers to this worker.
+    """
+    def __init__(self, host: str, port: int, slots: int = 1,
+                 heartbeat_interval: float = 2.0, name: str = None):
+        """Init a Worker. It doesn't connect until it's run.
+
+        Args:
+            host (str): The coordinator's host.
+            port (int): The coordinator's port.
+            slots (int, optional): How many tasks may run at once.
+            heartbeat_interval (float, optional): Seconds between
+                heartbeats. Keep it well under the coordinator's
+                heartbeat_timeout.
+            name (str, optional): How the coordinator refers to this worker.
+                Defaults to the hostname.
+        """
+        assert isinstance(slots, int), '`slots` must be an int'
+        assert slots >= 1, '`slots` must be at least 1'
+        assert heartbeat_interval > 0, '`heartbeat_interval` must be positive'
+
+        self.address = (host, port)
+        self.slots = slots
+        self.heartbeat_interval = heartbeat_interval
+        self.name = name or socket.gethostname()
+
+
+    def __repr__(self):
+        return f"{Worker.__qualname__}({self.name})"
+
+
+    def run(self) -> None:
+        """Connect to the coordinator and run tasks until it shuts down or
+        disconnects. Running tasks are finished first.
+        """
+        sock = socket.create_connection(self.address)
+        send_lock = Lock()
+        stopped = Event()
+
+        def send(message):
+            with send_lock:
+                try:
+                    _send(sock, message)
+                except OSError:
+                    pass
+
+        def heartbeat():
+            while not stopped.wait(self.heartbeat_interval):
+                send({'type': 'heartbeat'})
+
+        def run_task(message):
+            start = time.time()
+            try:
+                task = _task_from_dict(message['task'])
+                print(f'\nRunning {repr(task)}\n', flush=True)
+                process = Popen(**_get_popen_kwargs(task))
+                _wait_with_rusage(process)
+                returncode = process.returncode
+            # the coordinator waits for a result no matter what went wrong
+            except Exception as err:
+                print(repr(err), flush=True)
+                returncode = None
+            send({'type': 'result', 'id': message.get('id'),
+                  'returncode': returncode, 'start': start,
+                  'end': time.time()})
+
+        send({'type': 'hello', 'name': self.name, 'slots': self.slots})
+        Thread(target=heartbeat, daemon=True).start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.slots) as executor, \
+                    sock.makefile('rb') as ifile:
+                for line in ifile:
+                    message = json.loads(line)
+                    if message['type'] == 'task':
+                        executor.submit(run_task, message)
+                    elif message['type'] == 'shutdown':
+                        break
+        finally:
+            stopped.set()
+            sock.close()
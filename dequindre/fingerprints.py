@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""Skip tasks whose outputs are already up to date.
+
+Like make, dequindre can skip a task when nothing it depends on has changed
+since it last succeeded. A task's fingerprint is a hash of its script, its
+env, args, environ, and cwd, and the contents of its declared inputs. A task
+is up to date when
+
+- it declares outputs, and all of them exist,
+- its fingerprint matches the one recorded when it last succeeded,
+- none of its outputs are older than they were after that run, and
+- none of its upstream tasks ran.
+
+File contents are only hashed again when a file's mtime or size changes.
+"""
+
+import hashlib
+import json
+import os
+from typing import Optional
+
+from dequindre import Task
+
+
+_VERSION = 1
+
+
+class FingerprintStore:
+    """A JSON file of task fingerprints and file hashes.
+
+    Example:
+        >>> from dequindre import Task, DAG, Dequindre
+        >>> from dequindre.fingerprints import FingerprintStore
+        >>> steep_tea = Task('./steep_tea.py', inputs=('./water.txt',),
+        ...                  outputs=('./tea.txt',))
+        >>> dq = Dequindre(DAG(tasks={steep_tea}))
+        >>> with FingerprintStore('./tea-fingerprints.json') as fingerprints:
+        ...     dq.run_tasks(fingerprints=fingerprints)
+
+    Attributes:
+        path (str): Location of the JSON file.
+    """
+    def __init__(self, path: str):
+        """Open a fingerprint store. The file is created when it's saved.
+
+        Args:
+            path (str): Location of the JSON file.
+        """
+        assert isinstance(path, str), '`path` must be a str'
+        assert path, '`path` must not be an empty str'
+
+        self.path = path
+        self._tasks = {}
+        self._files = {}
+        if os.path.exists(path):
+            with open(path, 'r') as ifile:
+                data = json.load(ifile)
+            if data.get('version') == _VERSION:
+                for entry in data['tasks']:
+                    key = (entry['loc'], entry['env'])
+                    self._tasks[key] = (entry['fingerprint'], entry['time'])
+                for k, (mtime, size, digest) in data['files'].items():
+                    self._files[k] = (mtime, size, digest)
+
+
+    def __repr__(self):
+        return f"{FingerprintStore.__qualname__}({self.path})"
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.save()
+
+
+    def save(self) -> None:
+        """Write the fingerprints to the JSON file."""
+        data = {
+            'version': _VERSION,
+            'tasks': [
+                {'loc': loc, 'env': env, 'fingerprint': fp, 'time': time}
+                for (loc, env), (fp, time) in self._tasks.items()
+            ],
+            'files': {k: list(v) for k, v in self._files.items()},
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as ofile:
+            json.dump(data, ofile)
+        os.replace(tmp_path, self.path)
+
+
+    def file_hash(self, path: str) -> str:
+        """Return the sha256 of a file's contents.
+
+        The hash is cached until the file's mtime or size changes.
+
+        Raises:
+            OSError: The file can't be read.
+        """
+        stat = os.stat(path)
+        cached = self._files.get(path)
+        if cached is not None and cached[:2] == (stat.st_mtime, stat.st_size):
+            return cached[2]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as ifile:
+            for block in iter(lambda: ifile.read(1 << 20), b''):
+                digest.update(block)
+        self._files[path] = (stat.st_mtime, stat.st_size, digest.hexdigest())
+
+        return digest.hexdigest()
+
+
+    def fingerprint(self, task: Task) -> Optional[str]:
+        """Hash a task's script, env, args, environ, cwd, and inputs.
+
+        Returns:
+            str, or None if the script or an input can't be read.
+        """
+        digest = hashlib.sha256()
+        try:
+            for part in (task.env, task.loc, self.file_hash(task.loc),
+                         json.dumps([task.args, sorted(task.environ.items()),
+                                     task.cwd])):
+                digest.update(part.encode() + b'\0')
+            for path in task.inputs:
+                digest.update(path.encode() + b'\0')
+                digest.update(self.file_hash(path).encode() + b'\0')
+        except OSError:
+            return None
+
+        return digest.hexdigest()
+
+
+    def is_up_to_date(self, task: Task, fingerprint: str) -> bool:
+        """Check whether a task's outputs are unchanged since its last
+        successful run with the same fingerprint.
+
+        Upstream tasks aren't checked here; Dequindre.run_tasks does that.
+
+        Args:
+            task (`Task`): The task.
+            fingerprint (str): The task's current fingerprint.
+
+        Returns:
+            True if the task can be skipped. False otherwise.
+        """
+        if not task.outputs or fingerprint is None:
+            return False
+
+        recorded = self._tasks.get((task.loc, task.env))
+        if recorded is None or recorded[0] != fingerprint:
+            return False
+
+        for path in task.outputs:
+            try:
+                if os.stat(path).st_mtime < recorded[1]:
+                    return False
+            except OSError:
+                return False
+
+        return True
+
+
+    def update(self, task: Task, fingerprint: str) -> None:
+        """Record the fingerprint of a task that succeeded.
+
+        The fingerprint is stamped with the mtime of the task's oldest
+        output. Nothing is recorded if an output is missing.
+
+        Args:
+            task (`Task`): The task.
+            fingerprint (str): The task's fingerprint before it ran.
+        """
+        if not task.outputs or fingerprint is None:
+            return None
+
+        try:
+            time = min(os.stat(p).st_mtime for p in task.outputs)
+        except OSError:
+            return None
+
+        self._tasks[(task.loc, task.env)] = (fingerprint, time)
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""Keep a history of task runs.
+
+Every call to Dequindre.run_tasks() forgets how long its tasks took. The
+history module stores the start and end times, exit status, and resource
+usage of every task run in a SQLite file so they can be queried later. The
+scheduler can use the recorded durations to decide which tasks to start
+first.
+
+Tasks are identified by their loc and env, just like Task equality.
+"""
+
+import sqlite3
+import time
+from typing import Dict, Iterable, List
+
+from dequindre import Task
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS task_runs (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    loc TEXT NOT NULL,
+    env TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    duration REAL NOT NULL,
+    returncode INTEGER,
+    user_time REAL,
+    system_time REAL,
+    max_rss INTEGER
+);
+CREATE INDEX IF NOT EXISTS task_runs_task ON task_runs (loc, env);
+"""
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linearly interpolated percentile of values.
+
+    Args:
+        values (`list` of `float`): Values in any order. Must not be empty.
+        q (float): Percentile between 0 and 100.
+
+    Returns:
+        float
+    """
+    assert values, '`values` must not be empty'
+    assert 0 <= q <= 100, '`q` must be between 0 and 100'
+
+    values = sorted(values)
+    rank = (len(values) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+class RunHistory:
+    """A SQLite file of task runs.
+
+    Example:
+        >>> from dequindre import Task, DAG, Dequindre
+        >>> from dequindre.history import RunHistory
+        >>> boil_water = Task('./boil_water.py')
+        >>> dq = Dequindre(DAG(tasks={boil_water}))
+        >>> with RunHistory('./tea-history.sqlite3') as history:
+        ...     dq.run_tasks(history=history)
+        ...     history.get_duration_percentile(boil_water, 95)
+
+    Attributes:
+        path (str): Location of the SQLite file.
+    """
+    def __init__(self, path: str):
+        """Open a run history, creating the file if needed.
+
+        Args:
+            path (str): Location of the SQLite file. ':memory:' keeps the
+                history in memory only.
+        """
+        assert isinstance(path, str), '`path` must be a str'
+        assert path, '`path` must not be an empty str'
+
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(_SCHEMA)
+
+
+    def __repr__(self):
+        return f"{RunHistory.__qualname__}({self.path})"
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def close(self) -> None:
+        """Close the SQLite file."""
+        self._connection.close()
+
+
+    def start_run(self) -> int:
+        """Record the start of a run.
+
+        Returns:
+            int: The id of the new run.
+        """
+        with self._connection:
+            cursor = self._connection.execute(
+                'INSERT INTO runs (started) VALUES (?)', (time.time(),))
+
+        return cursor.lastrowid
+
+
+    def record(self, run_id: int, task: Task, start: float, end: float,
+               returncode: int, rusage=None) -> None:
+        """Record one run of a task.
+
+        Args:
+            run_id (int): The id returned by start_run.
+            task (`Task`): The task that ran.
+            start (float): Unix timestamp when the task started.
+            end (float): Unix timestamp when the task ended.
+            returncode (int): The task's exit status, or None if the task
+                failed before it could be started.
+            rusage (`resource.struct_rusage`, optional): The task's resource
+                usage, as returned by os.wait4. max_rss is in the platform's
+                units: kilobytes on Linux and bytes on macOS.
+        """
+        user_time = system_time = max_rss = None
+        if rusage is not None:
+            user_time = rusage.ru_utime
+            system_time = rusage.ru_stime
+            max_rss = rusage.ru_maxrss
+
+        with self._connection:
+            self._connection.execute(
+                'INSERT INTO task_runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (run_id, task.loc, task.env, start, end, end - start,
+                 returncode, user_time, system_time, max_rss))
+
+
+    def get_task_runs(self, task: Task) -> List[dict]:
+        """Return every recorded run of a task, oldest first.
+
+        Returns:
+            `list` of `dict`
+        """
+        cursor = self._connection.execute(
+            'SELECT run_id, start, end, duration, returncode, user_time, '
+            'system_time, max_rss FROM task_runs WHERE loc = ? AND env = ? '
+            'ORDER BY start', (task.loc, task.env))
+        columns = [c[0] for c in cursor.description]
+
+        return [dict(zip(columns, row)) for row in cursor]
+
+
+    def get_durations(self, task: Task,
+                      successful_only: bool = True) -> List[float]:
+        """Return the recorded durations of a task in seconds.
+
+        Args:
+            task (`Task`): The task.
+            successful_only (bool, optional): Ignore failed runs.
+
+        Returns:
+            `list` of `float`
+        """
+        query = 'SELECT duration FROM task_runs WHERE loc = ? AND env = ?'
+        if successful_only:
+            query += ' AND returncode = 0'
+        cursor = self._connection.execute(query, (task.loc, task.env))
+
+        return [row[0] for row in cursor]
+
+
+    def get_duration_percentile(self, task: Task, q: float = 50) -> float:
+        """Return a percentile of a task's successful durations.
+
+        Args:
+            task (`Task`): The task.
+            q (float, optional): Percentile between 0 and 100. Use 50 for
+                the median and 95 for the p95.
+
+        Returns:
+            float, or None if the task never succeeded.
+        """
+        durations = self.get_durations(task)
+        if not durations:
+            return None
+
+        return percentile(durations, q)
+
+
+    def get_duration_estimates(self, tasks: Iterable[Task],
+                               q: float = 50) -> Dict[Task, float]:
+        """Estimate task durations for Dequindre.run_tasks.
+
+        Args:
+            tasks (`set` of `Task`): The tasks to estimate.
+            q (float, optional): Percentile of past durations to use.
+
+        Returns:
+            `dict` of `Task`: `float`. Tasks that never succeeded are left
+            out.
+        """
+        estimates = {}
+        for t in tasks:
+            estimate = self.get_duration_percentile(t, q)
+            if estimate is not None:
+                estimates[t] = estimate
+
+        return estimates
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""Capture each task's output in its own log file.
+
+By default, tasks write straight to dequindre's terminal, and tasks that run
+at the same time interleave their output. TaskLogs sends each task's stdout
+and stderr to its own log file instead, optionally gzip-compressed, and
+keeps the last few KB of the latest tasks' output in memory for error
+reports.
+
+Output is read from the task's pipe as soon as it's written, so a chatty
+task never blocks on a full pipe, and dequindre never holds more than the
+tail of any task's output in memory, for a limited number of tasks.
+"""
+
+from collections import OrderedDict
+import gzip
+from hashlib import sha1
+import os
+import re
+from threading import Lock
+
+from dequindre import Task
+
+
+class TaskLog:
+    """The log file of one task run.
+
+    Attributes:
+        path (str): Location of the log file.
+    """
+    def __init__(self, path: str, compress: bool, tail_bytes: int):
+        self.path = path
+        self._file = gzip.open(path, 'wb') if compress else open(path, 'wb')
+        self._tail = bytearray()
+        self._tail_bytes = tail_bytes
+
+
+    def write(self, chunk: bytes) -> None:
+        """Write a chunk of output to the log file and the tail."""
+        self._file.write(chunk)
+        if not self._tail_bytes:
+            return None
+
+        self._tail += chunk[-self._tail_bytes:]
+        overflow = len(self._tail) - self._tail_bytes
+        if overflow > 0:
+            del self._tail[:overflow]
+
+
+    def close(self) -> None:
+        self._file.close()
+
+
+    @property
+    def tail(self) -> bytes:
+        """The last tail_bytes of output"""
+        return bytes(self._tail)
+
+
+class TaskLogs:
+    """A directory of task log files.
+
+    Example:
+        >>> from dequindre import Task, DAG, Dequindre
+        >>> from dequindre.logs import TaskLogs
+        >>> boil_water = Task('./boil_water.py')
+        >>> logs = TaskLogs('./tea-logs', compress=True)
+        >>> dq = Dequindre(DAG(tasks={boil_water}), logs=logs)
+        >>> dq.run_tasks()
+        >>> logs.get_tail(boil_water)
+        b'I am boiling water...\\n'
+
+    Attributes:
+        directory (str): Where log files are written.
+        compress (bool): Whether log files are gzip-compressed.
+        tail_bytes (int): How much of each task's output is kept in memory.
+        max_tails (int): How many tasks' tails are kept in memory.
+    """
+    def __init__(self, directory: str, compress: bool = False,
+                 tail_bytes: int = 64 * 1024, max_tails: int = 256):
+        """Init TaskLogs, creating the directory if needed.
+
+        Tails take at most tail_bytes * max_tails of memory, 16 MB by
+        default, however many tasks the DAG has.
+
+        Args:
+            directory (str): Where log files are written.
+            compress (bool, optional): gzip-compress log files.
+            tail_bytes (int, optional): How much of each task's output is
+                kept in memory. Defaults to 64 KB.
+            max_tails (int, optional): How many tasks' tails are kept in
+                memory. The tails of the tasks that started longest ago are
+                dropped first. Defaults to 256.
+        """
+        assert isinstance(directory, str), '`directory` must be a str'
+        assert directory, '`directory` must not be an empty str'
+        assert isinstance(tail_bytes, int), '`tail_bytes` must be an int'
+        assert tail_bytes >= 0, '`tail_bytes` must not be negative'
+        assert isinstance(max_tails, int), '`max_tails` must be an int'
+        assert max_tails >= 1, '`max_tails` must be at least 1'
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.compress = compress
+        self.tail_bytes = tail_bytes
+        self.max_tails = max_tails
+        # oldest first
+        self._logs = OrderedDict()
+        self._lock = Lock()
+
+
+    def __repr__(self):
+        return f"{TaskLogs.__qualname__}({self.directory})"
+
+
+    def get_path(self, task: Task) -> str:
+        """Return the location of a task's log file.
+
+        The name is the script's name, plus a short hash of the task's loc
+        and env so that tasks with the same script name don't collide.
+        """
+        name = os.path.splitext(os.path.basename(task.loc))[0]
+        name = re.sub(r'[^A-Za-z0-9_.-]+', '_', name)
+        key = sha1('\0'.join((task.loc, task.env)).encode()).hexdigest()[:8]
+        suffix = '.log.gz' if self.compress else '.log'
+
+        return os.path.join(self.directory, f'{name}-{key}{suffix}')
+
+
+    def open(self, task: Task) -> TaskLog:
+        """Start a new log for a task, replacing its last one."""
+        log = TaskLog(self.get_path(task), self.compress, self.tail_bytes)
+        with self._lock:
+            self._logs.pop(task, None)
+            self._logs[task] = log
+            while len(self._logs) > self.max_tails:
+                self._logs.popitem(last=False)
+
+        return log
+
+
+    def get_tail(self, task: Task) -> bytes:
+        """Return the end of a task's latest output.
+
+        Returns:
+            bytes, or None if the task hasn't run, or if max_tails tasks
+            have started since it did.
+        """
+        with self._lock:
+            log = self._logs.get(task)
+
+        return None if log is None else log.tail
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""Save DAGs in a compact binary file and load them quickly.
+
+Building a large DAG from Python definitions means constructing every Task,
+checking every dependency for cycles, and updating the indexes one edge at a
+time. A snapshot stores a DAG that's already been built, so loading one only
+has to read a few arrays.
+
+Every str in the DAG (locs, envs, args, paths, ...) is stored once in a
+string table, and everything else refers to strs by their index. Tasks are
+numbered in the order they're stored, and the edges are stored twice, as
+compressed sparse row arrays of downstream and of upstream task numbers, so
+both of the DAG's indexes can be rebuilt without any lookups.
+
+Layout, after the magic bytes and format version, is a series of arrays.
+Each array is a one byte typecode, an unsigned 8 byte length, and the
+little-endian items:
+
+    string table    byte offsets into the string blob, the string blob
+    tasks           loc ids, env ids, cwd ids (0 for None, otherwise id + 1)
+    inputs          offsets per task, string ids
+    outputs         offsets per task, string ids
+    args            offsets per task, string ids
+    environ         offsets per task, key ids, value ids
+    resources       offsets per task, key ids, float64 amounts
+    downstream      offsets per task, downstream task numbers
+    upstream        offsets per task, upstream task numbers
+
+Note:
+    Loading a snapshot doesn't check it for cycles. Only DAGs can be saved,
+    so a snapshot has none unless the file has been tampered with.
+"""
+
+from array import array
+from collections import defaultdict
+import mmap
+import os
+import struct
+import sys
+from typing import List
+
+from dequindre import Task, DAG, _gc_paused
+
+
+_MAGIC = b'DQDAG'
+_VERSION = 1
+_HEADER = struct.Struct('<5sH')
+_ARRAY_HEADER = struct.Struct('<cQ')
+
+# the typecodes in the file, and the local typecodes with the same size
+_TYPECODES = {
+    b'B': 'B',
+    b'I': next(c for c in 'IL' if array(c).itemsize == 4),
+    b'Q': next(c for c in 'LQ' if array(c).itemsize == 8),
+    b'd': 'd',
+}
+
+
+def _write_array(ofile, typecode: bytes, values) -> None:
+    items = array(_TYPECODES[typecode], values)
+    if sys.byteorder == 'big':
+        items.byteswap()
+    ofile.write(_ARRAY_HEADER.pack(typecode, len(items)))
+    ofile.write(items.tobytes())
+
+
+def _read_array(buffer: memoryview, position: int, typecode: bytes) -> tuple:
+    """Read the array that starts at position.
+
+    Returns:
+        The array, and the position after it.
+    """
+    if position + _ARRAY_HEADER.size > len(buffer):
+        raise ValueError('the snapshot is truncated')
+    found, length = _ARRAY_HEADER.unpack_from(buffer, position)
+    if found != typecode:
+        raise ValueError(f'expected an array of {typecode}, found {found}')
+
+    items = array(_TYPECODES[typecode])
+    start = position + _ARRAY_HEADER.size
+    end = start + length * items.itemsize
+    if end > len(buffer):
+        raise ValueError('the snapshot is truncated')
+    items.frombytes(buffer[start:end])
+    if sys.byteorder == 'big':
+        items.byteswap()
+
+    return items, end
+
+
+def _flatten(groups: List[list]) -> tuple:
+    """Flatten groups of items into CSR offsets and items"""
+    offsets = [0]
+    items = []
+    for group in groups:
+        items.extend(group)
+        offsets.append(len(items))
+
+    return offsets, items
+
+
+def save_dag(dag: DAG, path: str) -> None:
+    """Write a DAG to a snapshot file.
+
+    The file is replaced atomically, so readers never see half a snapshot.
+
+    Args:
+        dag (`DAG`): The DAG to save.
+        path (str): Location of the snapshot file.
+    """
+    assert isinstance(dag, DAG), '`dag` must be a DAG'
+    assert isinstance(path, str), '`path` must be a str'
+    assert path, '`path` must not be an empty str'
+
+    dag._reduce_if_pending()
+    strings = {}
+
+    def intern(s):
+        i = strings.get(s)
+        if i is None:
+            i = strings[s] = len(strings)
+        return i
+
+    tasks = sorted(dag.tasks)
+    numbers = {t: i for i, t in enumerate(tasks)}
+    locs = [intern(t.loc) for t in tasks]
+    envs = [intern(t.env) for t in tasks]
+    cwds = [0 if t.cwd is None else intern(t.cwd) + 1 for t in tasks]
+    inputs = _flatten([intern(p) for p in t.inputs] for t in tasks)
+    outputs = _flatten([intern(p) for p in t.outputs] for t in tasks)
+    args = _flatten([intern(a) for a in t.args] for t in tasks)
+    environ_offsets, environ_keys = _flatten(
+        [intern(k) for k in t.environ] for t in tasks)
+    environ_values = [intern(v) for t in tasks for v in t.environ.values()]
+    resource_offsets, resource_keys = _flatten(
+        [intern(k) for k in t.resources] for t in tasks)
+    resource_amounts = [n for t in tasks for n in t.resources.values()]
+    downstream = _flatten(sorted(numbers[d] for d in dag._edges.get(t, ()))
+                          for t in tasks)
+    upstream = _flatten(sorted(numbers[u] for u in dag._upstream.get(t, ()))
+                        for t in tasks)
+
+    encoded = [s.encode() for s in strings]
+    string_offsets = [0]
+    for s in encoded:
+        string_offsets.append(string_offsets[-1] + len(s))
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as ofile:
+        ofile.write(_HEADER.pack(_MAGIC, _VERSION))
+        _write_array(ofile, b'Q', string_offsets)
+        _write_array(ofile, b'B', b''.join(encoded))
+        for ids in (locs, envs, cwds):
+            _write_array(ofile, b'I', ids)
+        for offsets, ids in (inputs, outputs, args):
+            _write_array(ofile, b'I', offsets)
+            _write_array(ofile, b'I', ids)
+        _write_array(ofile, b'I', environ_offsets)
+        _write_array(ofile, b'I', environ_keys)
+        _write_array(ofile, b'I', environ_values)
+        _write_array(ofile, b'I', resource_offsets)
+        _write_array(ofile, b'I', resource_keys)
+        _write_array(ofile, b'd', resource_amounts)
+        for offsets, numbers in (downstream, upstream):
+            _write_array(ofile, b'I', offsets)
+            _write_array(ofile, b'I', numbers)
+    os.replace(tmp_path, path)
+
+
+def _load(path: str, use_mmap: bool, read):
+    """Open a snapshot file and call read(buffer, path) on its contents"""
+    with open(path, 'rb') as ifile:
+        if use_mmap:
+            # an empty file can't be mapped
+            if os.fstat(ifile.fileno()).st_size == 0:
+                raise ValueError(f'{path} is not a DAG snapshot')
+            data = mmap.mmap(ifile.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            data = ifile.read()
+
+    try:
+        with _gc_paused(), memoryview(data) as buffer:
+            return read(buffer, path)
+    finally:
+        if use_mmap:
+            data.close()
+
+
+def load_dag(path: str, use_mmap: bool = False) -> DAG:
+    """Read a DAG from a snapshot file.
+
+    Args:
+        path (str): Location of the snapshot file.
+        use_mmap (bool, optional): Map the file into memory instead of
+            reading it all at once. The OS then only reads the pages that
+            are used, and keeps them cached between processes.
+
+    Raises:
+        ValueError: The file isn't a snapshot, or was written by a newer
+            version of dequindre.
+
+    Returns:
+        `DAG`
+    """
+    return _load(path, use_mmap, _read_dag)
+
+
+def _read_snapshot(buffer: memoryview, path: str) -> dict:
+    """Read the string table and every array in a snapshot.
+
+    Returns:
+        `dict` with the strings, and the arrays named as in the layout.
+        CSR arrays are tuples of their offsets and items.
+    """
+    if len(buffer) < _HEADER.size:
+        raise ValueError(f'{path} is not a DAG snapshot')
+    magic, version = _HEADER.unpack_from(buffer, 0)
+    if magic != _MAGIC:
+        raise ValueError(f'{path} is not a DAG snapshot')
+    if version > _VERSION:
+        raise ValueError(f'{path} is a version {version} snapshot, and '
+                         f'only versions up to {_VERSION} can be read')
+
+    position = _HEADER.size
+
+    def read(typecode):
+        nonlocal position
+        items, position = _read_array(buffer, position, typecode)
+        return items
+
+    string_offsets = read(b'Q')
+    blob = read(b'B').tobytes()
+    strings = [blob[string_offsets[i]:string_offsets[i + 1]].decode()
+               for i in range(len(string_offsets) - 1)]
+
+    return {
+        'strings': strings,
+        'locs': read(b'I'),
+        'envs': read(b'I'),
+        'cwds': read(b'I'),
+        'inputs': (read(b'I'), read(b'I')),
+        'outputs': (read(b'I'), read(b'I')),
+        'args': (read(b'I'), read(b'I')),
+        'environ': (read(b'I'), read(b'I'), read(b'I')),
+        'resources': (read(b'I'), read(b'I'), read(b'd')),
+        'downstream': (read(b'I'), read(b'I')),
+        'upstream': (read(b'I'), read(b'I')),
+    }
+
+
+def _make_tasks(snapshot: dict, numbers: List[int]) -> List[Task]:
+    """Build the Tasks with these numbers from a snapshot"""
+    strings = snapshot['strings']
+
+    def strs(csr):
+        offsets, ids = csr
+        if not ids:
+            return [()] * len(numbers)
+        ids = [strings[j] for j in ids]
+        return [tuple(ids[offsets[i]:offsets[i + 1]]) for i in numbers]
+
+    def mappings(csr):
+        offsets, keys, values = csr
+        if not keys:
+            return [{}] * len(numbers)
+        items = list(zip((strings[j] for j in keys), values))
+        return [dict(items[offsets[i]:offsets[i + 1]]) for i in numbers]
+
+    offsets, keys, values = snapshot['environ']
+    environs = mappings((offsets, keys, [strings[j] for j in values]))
+    locs, envs, cwds = snapshot['locs'], snapshot['envs'], snapshot['cwds']
+
+    return list(map(
+        Task._from_fields,
+        [strings[locs[i]] for i in numbers],
+        [strings[envs[i]] for i in numbers],
+        strs(snapshot['inputs']),
+        strs(snapshot['outputs']),
+        strs(snapshot['args']),
+        environs,
+        [None if cwds[i] == 0 else strings[cwds[i] - 1] for i in numbers],
+        mappings(snapshot['resources']),
+    ))
+
+
+def _read_dag(buffer: memoryview, path: str) -> DAG:
+    snapshot = _read_snapshot(buffer, path)
+    tasks = _make_tasks(snapshot, range(len(snapshot['locs'])))
+
+    def index(csr):
+        """Rebuild an adjacency dict, and the tasks that aren't in it"""
+        offsets, numbers = csr
+        offsets, numbers = offsets.tolist(), numbers.tolist()
+        adjacent, missing = {}, set()
+        for i, task in enumerate(tasks):
+            start, end = offsets[i], offsets[i + 1]
+            if start == end:
+                missing.add(task)
+            else:
+                adjacent[task] = set(map(tasks.__getitem__,
+                                         numbers[start:end]))
+        return defaultdict(set, adjacent), missing
+
+    dag = DAG()
+    dag.tasks = set(tasks)
+    dag._edges, dag._sinks = index(snapshot['downstream'])
+    dag._upstream, dag._sources = index(snapshot['upstream'])
+
+    return dag
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""Run tasks in pre-warmed interpreters.
+
+Starting a fresh interpreter for every task, and importing pandas in every
+one of them, can take longer than the task itself. A WarmPool keeps
+long-lived worker interpreters for each Task.env. The workers import any
+preloaded modules once, then fork a child for every task, and the child
+runs the task's script with runpy. The fork shares everything the worker
+already imported, so each task starts in milliseconds.
+
+Note:
+    Workers need os.fork, so warm pools only work on POSIX systems. Each
+    worker is started as `{env} -c <worker source>`, so env must be the
+    path to a python interpreter.
+"""
+
+import json
+import os
+import signal
+from subprocess import Popen, PIPE
+from threading import Lock
+from types import SimpleNamespace
+from typing import Iterable
+
+from dequindre import Task
+
+
+# The worker must only use the standard library; dequindre may not be
+# installed in the task's environment.
+_WORKER_SOURCE = r'''
+import json, os, runpy, sys, traceback
+
+response_fd = int(sys.argv[1])
+for module in sys.argv[2:]:
+    __import__(module)
+
+def run(request):
+    os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+    loc = request['loc']
+    sys.argv = [loc] + request['args']
+    sys.path[0] = os.path.dirname(loc)
+    os.environ.update(request['environ'])
+    if request['cwd'] is not None:
+        os.chdir(request['cwd'])
+    try:
+        runpy.run_path(loc, run_name='__main__')
+        code = 0
+    except SystemExit as err:
+        if err.code is None:
+            code = 0
+        elif isinstance(err.code, int):
+            code = err.code
+        else:
+            print(err.code, file=sys.stderr)
+            code = 1
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(code)
+
+for line in sys.stdin:
+    request = json.loads(line)
+    pid = os.fork()
+    if pid == 0:
+        run(request)
+    os.write(response_fd, (json.dumps({'pid': pid}) + '\n').encode())
+    _, status, rusage = os.wait4(pid, 0)
+    if os.WIFSIGNALED(status):
+        returncode = -os.WTERMSIG(status)
+    else:
+        returncode = os.WEXITSTATUS(status)
+    response = {
+        'returncode': returncode,
+        'ru_utime': rusage.ru_utime,
+        'ru_stime': rusage.ru_stime,
+        'ru_maxrss': rusage.ru_maxrss,
+    }
+    os.write(response_fd, (json.dumps(response) + '\n').encode())
+'''
+
+
+class _Worker:
+    """One long-lived interpreter that forks a child per task."""
+
+    def __init__(self, env: str, preload: tuple):
+        read_fd, write_fd = os.pipe()
+        try:
+            self.process = Popen(
+                [env, '-c', _WORKER_SOURCE, str(write_fd), *preload],
+                stdin=PIPE, pass_fds=(write_fd,))
+        finally:
+            os.close(write_fd)
+        self.responses = os.fdopen(read_fd, 'r')
+        # the forked child running the current task, once it's known
+        self.child_pid = None
+        self.killed = False
+        self._lock = Lock()
+
+
+    def _read_response(self, task: Task) -> dict:
+        line = self.responses.readline()
+        if not line:
+            raise OSError(f'the worker for {task.env} died')
+
+        return json.loads(line)
+
+
+    def run(self, task: Task) -> SimpleNamespace:
+        """Run one task and wait for it to end.
+
+        Raises:
+            OSError: The worker died.
+        """
+        request = json.dumps({
+            'loc': os.path.abspath(task.loc),
+            'args': list(task.args),
+            'environ': dict(task.environ),
+            'cwd': task.cwd,
+        }) + '\n'
+        self.process.stdin.write(request.encode())
+        self.process.stdin.flush()
+
+        pid = self._read_response(task)['pid']
+        with self._lock:
+            self.child_pid = pid
+            if self.killed:
+                self._kill_child()
+        try:
+            return SimpleNamespace(**self._read_response(task))
+        finally:
+            with self._lock:
+                self.child_pid = None
+
+
+    def _kill_child(self) -> None:
+        try:
+            os.kill(self.child_pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+    def kill(self) -> None:
+        """Kill the task that's running, or that's about to run. The worker
+        itself keeps running."""
+        with self._lock:
+            self.killed = True
+            if self.child_pid is not None:
+                self._kill_child()
+
+
+    def close(self) -> None:
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.wait()
+        self.responses.close()
+
+
+class WarmPool:
+    """Long-lived worker interpreters, grouped by Task.env.
+
+    Workers are started the first time they're needed, and are reused by
+    later tasks with the same env. A pool can be shared by many runs.
+
+    Example:
+        >>> from dequindre import Task, DAG, Dequindre
+        >>> from dequindre.warm import WarmPool
+        >>> boil_water = Task('./boil_water.py', '/usr/bin/python3')
+        >>> with WarmPool(preload=('pandas',)) as pool:
+        ...     dq = Dequindre(DAG(tasks={boil_water}), warm_pool=pool)
+        ...     dq.run_tasks()
+
+    Attributes:
+        preload (`tuple` of `str`): Modules every worker imports up front.
+    """
+    def __init__(self, preload: Iterable[str] = ()):
+        """Init a WarmPool. No workers are started yet.
+
+        Args:
+            preload (`tuple` of `str`, optional): Modules every worker
+                imports before it runs any tasks.
+        """
+        assert hasattr(os, 'fork'), 'warm pools need os.fork'
+        preload = tuple(preload)
+        assert all(isinstance(m, str) and m for m in preload), \
+            '`preload` must be non-empty strs'
+
+        self.preload = preload
+        self._idle = {}
+        # the workers running each task
+        self._running = {}
+        self._lock = Lock()
+
+
+    def __repr__(self):
+        return f"{WarmPool.__qualname__}({self.preload})"
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def _acquire(self, env: str) -> _Worker:
+        with self._lock:
+            idle = self._idle.get(env)
+            if idle:
+                return idle.pop()
+
+        return _Worker(env, self.preload)
+
+
+    def _release(self, env: str, worker: _Worker) -> None:
+        with self._lock:
+            self._idle.setdefault(env, []).append(worker)
+
+
+    def run(self, task: Task) -> SimpleNamespace:
+        """Run a task in a warm worker for its env.
+
+        Args:
+            task (`Task`): The task to be run.
+
+        Returns:
+            `types.SimpleNamespace` with the task's returncode, and its
+            resource usage as ru_utime, ru_stime, and ru_maxrss.
+        """
+        worker = self._acquire(task.env)
+        worker.killed = False
+        with self._lock:
+            self._running[task] = worker
+        try:
+            result = worker.run(task)
+        except BaseException:
+            worker.process.kill()
+            worker.close()
+            raise
+        finally:
+            with self._lock:
+                self._running.pop(task, None)
+
+        self._release(task.env, worker)
+
+        return result
+
+
+    def kill(self, task: Task) -> None:
+        """Kill a task that's running in the pool. Its run returns with the
+        task's exit status, which is -SIGKILL. Tasks that aren't running are
+        ignored.
+
+        Args:
+            task (`Task`): The task to be killed.
+        """
+        with self._lock:
+            worker = self._running.get(task)
+        if worker is not None:
+            worker.kill()
+
+
+    def close(self) -> None:
+        """Stop every idle worker."""
+        with self._lock:
+            workers = [w for idle in self._idle.values() for w in idle]
+            self._idle.clear()
+
+        for worker in workers:
+            worker.close()
@@ -28,5 +28,11 @@ setup(
         "Intended Audience :: Developers",
         "Intended Audience :: Education",
     ],
+    extras_require={
+        'numpy': ['numpy'],
+    },
+    entry_points={
+        'console_scripts': ['dequindre=dequindre.__main__:main'],
+    },
     include_package_data=True
 )
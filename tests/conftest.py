@@ -0,0 +1,19 @@
+"""Fixtures shared by the unit tests."""
+
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def run_async():
+    """Run coroutines to the end on a new event loop.
+
+    Like asyncio.run, which needs python 3.7.
+    """
+    loop = asyncio.new_event_loop()
+    # subprocesses are watched through the current event loop
+    asyncio.set_event_loop(loop)
+    yield loop.run_until_complete
+    asyncio.set_event_loop(None)
+    loop.close()
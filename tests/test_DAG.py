@@ -168,3 +168,361 @@ def test__DAG_is_cyclic():
     
     with pytest.raises(CyclicGraphError):
         dag.add_dependency(A, depends_on=B)
+
+
+def test__DAG_add_dependency_cycle_leaves_dag_acyclic():
+    A, B = get_two_tasks()
+    C = Task('C.py', env='test-env')
+    dag = DAG(dependencies={B: A, C: B})
+
+    with pytest.raises(CyclicGraphError):
+        dag.add_dependency(A, depends_on=C)
+
+    with pytest.raises(CyclicGraphError):
+        dag.add_dependency(A, depends_on=A)
+
+    assert not dag.is_cyclic()
+    assert dag.get_downstream() == {A: {B}, B: {C}}
+
+
+def test__DAG_add_dependencies_cycle_rollback():
+    A, B = get_two_tasks()
+    C = Task('C.py', env='test-env')
+    D = Task('D.py', env='test-env')
+    E = Task('E.py', env='test-env')
+    dag = DAG(dependencies={B: A})
+
+    with pytest.raises(CyclicGraphError) as err:
+        dag.add_dependencies({
+            C: B,
+            A: C,
+            D: E,
+            E: {D, A},
+        })
+
+    msg = str(err.value)
+    assert 'Task(A.py) -> Task(B.py) -> Task(C.py) -> Task(A.py)' in msg
+    assert 'Task(D.py) -> Task(E.py) -> Task(D.py)' in msg
+
+    assert dag.tasks == {A, B}
+    assert dag.get_downstream() == {A: {B}}
+
+
+def test__DAG_add_dependencies_bad_task_rollback():
+    A, B = get_two_tasks()
+    C = Task('C.py', env='test-env')
+    dag = DAG(tasks={A})
+
+    with pytest.raises(AssertionError):
+        dag.add_dependencies({B: A, C: {'x'}})
+    with pytest.raises(AssertionError):
+        dag.add_dependencies({B: A, 'x': C})
+
+    assert dag.tasks == {A}
+    assert dag.get_downstream() == {}
+    assert dag.get_sources() == {A}
+    assert dag.get_sinks() == {A}
+
+
+def test__DAG_indexes_follow_mutations():
+    A, B = get_two_tasks()
+    C = Task('C.py', env='test-env')
+    dag = DAG(dependencies={B: A, C: {A, B}})
+
+    assert dag.get_task_downstream(A) == {B, C}
+    assert dag.get_task_upstream(C) == {A, B}
+    assert dag.get_in_degree(C) == 2
+    assert dag.get_out_degree(A) == 2
+    assert dag.get_sources() == {A}
+    assert dag.get_sinks() == {C}
+
+    dag.remove_task(B)
+    assert dag.get_downstream() == {A: {C}}
+    assert dag.get_upstream() == {C: {A}}
+    assert dag.get_in_degree(C) == 1
+
+    dag.remove_task(A)
+    assert dag.get_downstream() == {}
+    assert dag.get_upstream() == {}
+    assert dag.get_sources() == {C}
+    assert dag.get_sinks() == {C}
+
+    with pytest.raises(KeyError):
+        dag.remove_task(A)
+
+
+def test__DAG_copy():
+    A, B = get_two_tasks()
+    C = Task('C.py', env='test-env')
+    dag = DAG(dependencies={B: A, C: B}, auto_reduce=True)
+    copy = dag.copy()
+
+    assert copy.auto_reduce
+    assert copy.tasks == dag.tasks
+    assert copy.get_downstream() == dag.get_downstream()
+    assert copy.get_upstream() == dag.get_upstream()
+    # Tasks are shared, and everything else is independent
+    assert {id(t) for t in copy.tasks} == {id(t) for t in dag.tasks}
+
+    copy.remove_task(B)
+    assert dag.get_downstream() == {A: {B}, B: {C}}
+    assert dag.get_sources() == {A}
+    assert dag.get_sinks() == {C}
+
+
+def test__DAG_get_topological_order():
+    A, B = get_two_tasks()
+    C = Task('C.py', env='test-env')
+    Z = Task('Z.py', env='test-env')
+    dag = DAG(tasks={Z}, dependencies={B: {A, C}, C: A})
+
+    assert dag.get_topological_order() == [A, Z, C, B]
+
+    dag._add_edge(B, A)  # skips the cycle check
+    with pytest.raises(CyclicGraphError):
+        dag.get_topological_order()
+
+
+def test__DAG_add_dependencies_one_task_at_a_time():
+    """Small batches only search the region around the new dependencies"""
+    import time
+
+    tasks = [Task(f'{i}.py', env='test-env') for i in range(5000)]
+    dag = DAG()
+    start = time.time()
+    for upstream, task in zip(tasks, tasks[1:]):
+        dag.add_dependencies({task: upstream})
+    assert time.time() - start < 5
+
+    with pytest.raises(CyclicGraphError) as err:
+        dag.add_dependencies({tasks[10]: tasks[12]})
+    assert 'Task(10.py) -> Task(11.py) -> Task(12.py) -> Task(10.py)' \
+        in str(err.value)
+    assert tasks[10] not in dag.get_task_downstream(tasks[12])
+    assert not dag.is_cyclic()
+
+
+def test__DAG_deep_chain():
+    """Traversals mustn't recurse once per task"""
+    import sys
+
+    n = 10 * sys.getrecursionlimit()
+    tasks = [Task(f'{i}.py', env='test-env') for i in range(n)]
+    dag = DAG(dependencies=dict(zip(tasks[1:], tasks)))
+    dag.add_dependency(Task('end.py', env='test-env'), depends_on=tasks[-1])
+
+    assert not dag.is_cyclic()
+    assert dag.get_topological_order()[:2] == tasks[:2]
+
+    with pytest.raises(CyclicGraphError):
+        dag.add_dependency(tasks[0], depends_on=tasks[-1])
+
+    with pytest.raises(CyclicGraphError):
+        dag.add_dependencies({tasks[0]: tasks[-1]})
+
+    assert not dag.is_cyclic()
+
+
+@pytest.mark.parametrize('use_mmap', [False, True])
+def test__DAG_save_load(tmp_path, use_mmap):
+    A = Task('A.py', 'test-env', inputs=('in.txt',), outputs=('out.txt',),
+             args=('--date', '2019-02-01'), environ={'TEA': 'green'},
+             cwd='/tmp', resources={'memory': 30, 'cpu': 0.5})
+    B = Task('B.py', 'test-env', args=('--date', '2019-02-01'))
+    C = Task('C.py', 'other-env')
+    D = Task('D.py', 'tëa-env')
+    Z = Task('Z.py', 'test-env')
+    dag = DAG(tasks={Z}, dependencies={B: A, C: {A, B}, D: C})
+    path = str(tmp_path / 'make-tea.dag')
+
+    dag.save(path)
+    loaded = DAG.load(path, use_mmap=use_mmap)
+
+    assert loaded.tasks == dag.tasks
+    assert loaded.get_downstream() == dag.get_downstream()
+    assert loaded.get_upstream() == dag.get_upstream()
+    assert loaded.get_sources() == {A, Z}
+    assert loaded.get_sinks() == {D, Z}
+    assert loaded.get_topological_order() == dag.get_topological_order()
+
+    fields = lambda t: (t.inputs, t.outputs, t.args, dict(t.environ), t.cwd,
+                        dict(t.resources))
+    for t in dag.tasks:
+        u = next(u for u in loaded.tasks if u == t)
+        assert fields(u) == fields(t)
+        assert hash(u) == hash(t)
+
+    # the loaded DAG still checks new dependencies
+    with pytest.raises(CyclicGraphError):
+        loaded.add_dependency(A, depends_on=D)
+    loaded.remove_task(C)
+    assert loaded.get_sinks() == {B, D, Z}
+
+    DAG().save(path)
+    assert DAG.load(path, use_mmap=use_mmap).tasks == set()
+
+
+def test__DAG_load_bad_file(tmp_path):
+    path = tmp_path / 'not-a.dag'
+    for contents in (b'', b'PK\x03\x04 not a dag'):
+        path.write_bytes(contents)
+        for use_mmap in (False, True):
+            with pytest.raises(ValueError):
+                DAG.load(str(path), use_mmap=use_mmap)
+
+    DAG(tasks={Task('A.py')}).save(str(path))
+    truncated = path.read_bytes()[:-3]
+    path.write_bytes(truncated)
+    with pytest.raises(ValueError):
+        DAG.load(str(path))
+
+
+def test__DAG_ancestors_descendants():
+    A, B, C, D, E = (Task(f'{x}.py', 'test-env') for x in 'ABCDE')
+    dag = DAG(tasks={E}, dependencies={B: A, C: B, D: {A, C}})
+
+    assert dag.ancestors(D) == {A, B, C}
+    assert dag.ancestors({B, E}) == {A}
+    assert dag.descendants(A) == {B, C, D}
+    assert dag.descendants({C, E}) == {D}
+
+    # memoized answers are dropped when the DAG changes
+    assert dag.descendants(B) == {C, D}
+    dag.add_dependency(E, depends_on=C)
+    assert dag.descendants(B) == {C, D, E}
+    assert dag.ancestors(E) == {A, B, C}
+    dag.remove_task(C)
+    assert dag.descendants(B) == set()
+    assert dag.ancestors(E) == set()
+    assert dag.descendants(A) == {B, D}
+
+    with pytest.raises(AssertionError):
+        dag.ancestors(C)
+
+
+def test__DAG_subdag():
+    A, B, C, D, E = (Task(f'{x}.py', 'test-env') for x in 'ABCDE')
+    dag = DAG(tasks={E}, dependencies={B: A, C: B, D: {A, C}})
+
+    sub = dag.subdag({A, E})
+    assert sub.tasks == {A, E}
+    assert sub.get_downstream() == {}
+
+    # D depends on B through C
+    sub = dag.subdag({B, D})
+    assert sub.get_downstream() == {B: {D}}
+
+    sub = dag.subdag(C, include_upstream=True)
+    assert sub.tasks == {A, B, C}
+    assert sub.get_downstream() == {A: {B}, B: {C}}
+
+    sub = dag.subdag(B, include_downstream=True)
+    assert sub.tasks == {B, C, D}
+    assert sub.get_sources() == {B}
+    assert sub.get_sinks() == {D}
+
+    # the subdag is a separate DAG
+    sub.remove_task(C)
+    assert dag.get_task_downstream(C) == {D}
+
+
+def test__DAG_transitive_reduction():
+    from random import Random
+    from dequindre import Dequindre
+
+    A, B, C, D = (Task(f'{x}.py', 'test-env') for x in 'ABCD')
+    dag = DAG(dependencies={B: A, C: {A, B}, D: {A, B, C}})
+    assert dag.transitive_reduction() == 3
+    assert dag.get_downstream() == {A: {B}, B: {C}, C: {D}}
+    assert dag.transitive_reduction() == 0
+
+    rng = Random(2019)
+    tasks = [Task(f'{i}.py', 'test-env') for i in range(60)]
+    dag = DAG(tasks=set(tasks))
+    for i, t in enumerate(tasks[1:], 1):
+        dag.add_dependencies({t: set(rng.sample(tasks[:i], min(i, 4)))})
+    reachable = {t: dag.descendants(t) for t in tasks}
+    schedules = Dequindre(dag).get_schedules()
+    edges = sum(len(v) for v in dag.get_downstream().values())
+
+    removed = dag.transitive_reduction()
+    assert removed > 0
+    assert sum(len(v) for v in dag.get_downstream().values()) \
+        == edges - removed
+    assert {t: dag.descendants(t) for t in tasks} == reachable
+    assert Dequindre(dag).get_schedules() == schedules
+    # no edge that's left can be implied by the others
+    for u, children in dag.get_downstream().items():
+        for v in children:
+            dag._remove_edge(u, v)
+            assert v not in dag.descendants(u)
+            dag._add_edge(u, v)
+
+
+def test__DAG_auto_reduce():
+    A, B, C, D = (Task(f'{x}.py', 'test-env') for x in 'ABCD')
+
+    dag = DAG(dependencies={B: A, C: {A, B}}, auto_reduce=True)
+    assert dag.get_downstream() == {A: {B}, B: {C}}
+
+    dag.add_dependency(C, depends_on=A)
+    assert dag.get_downstream() == {A: {B}, B: {C}}
+
+    dag.add_dependency(D, depends_on=A)
+    dag.add_dependency(D, depends_on=C)
+    assert dag.get_downstream() == {A: {B}, B: {C}, C: {D}}
+    assert dag.get_task_upstream(D) == {C}
+
+    # a new edge can make older ones redundant
+    E = Task('E.py', 'test-env')
+    dag.add_dependencies({D: E, E: A})
+    assert dag.get_task_upstream(D) == {C, E}
+    dag.add_dependency(E, depends_on=C)
+    assert dag.get_downstream() == {A: {B}, B: {C}, C: {E}, E: {D}}
+    assert dag.edges_reduced == 4
+
+    with pytest.raises(AssertionError):
+        DAG(auto_reduce=1)
+
+
+def test__DAG_auto_reduce_remove_task():
+    """Removing a task keeps the dependencies that were dropped because
+    they went through it"""
+    A, B, C, D = (Task(f'{x}.py', 'test-env') for x in 'ABCD')
+    dependencies = {B: A, C: {A, B}, D: {A, C}}
+
+    dag = DAG(dependencies=dependencies, auto_reduce=True)
+    assert dag.get_downstream() == {A: {B}, B: {C}, C: {D}}
+    assert dag.edges_reduced == 2
+
+    dag.remove_task(B)
+    plain = DAG(dependencies=dependencies)
+    plain.remove_task(B)
+    assert dag.get_downstream() == {A: {C}, C: {D}}
+    assert dag.descendants(A) == plain.descendants(A) == {C, D}
+    assert dag.edges_reduced == 3
+
+    # dropped dependencies aren't counted twice
+    dag.add_dependency(D, depends_on=A)
+    dag.add_dependencies({D: {A, C}})
+    assert dag.get_downstream() == {A: {C}, C: {D}}
+    assert dag.edges_reduced == 3
+
+    dag.remove_task(C)
+    assert dag.get_downstream() == {A: {D}}
+
+
+def test__DAG_auto_reduce_is_lazy():
+    """Dependencies are only reduced when they're read"""
+    import time
+
+    tasks = [Task(f'{i}.py', 'test-env') for i in range(10000)]
+    dag = DAG(auto_reduce=True)
+    start = time.time()
+    for upstream, task in zip(tasks, tasks[1:]):
+        dag.add_dependency(task, depends_on=upstream)
+    dag.add_dependency(tasks[-1], depends_on=tasks[0])
+    assert time.time() - start < 5
+
+    assert dag.get_task_upstream(tasks[-1]) == {tasks[-2]}
+    assert dag.edges_reduced == 1
@@ -1,12 +1,39 @@
 """Unit tests for the Dequindre class."""
 
 from collections import defaultdict
+from threading import Lock
 
 import pytest
 
 from dequindre import Task, DAG, Dequindre
 from dequindre.exceptions import EarlyAbortError
 
+
+class RecordingDequindre(Dequindre):
+    """Record the tasks started instead of running them.
+
+    Args:
+        dag (DAG): The DAG of tasks to be orchestrated.
+        on_run (callable): Called with each task after it's recorded, in
+            place of the task's work.
+        **kwargs: Passed on to Dequindre.
+    """
+
+    def __init__(self, dag, on_run=None, **kwargs):
+        super().__init__(dag, **kwargs)
+        self.started = []
+        self.on_run = on_run
+        self._lock = Lock()
+
+
+    def run_task(self, task):
+        assert task in self.dag
+        with self._lock:
+            self.started.append(task)
+        if self.on_run is not None:
+            self.on_run(task)
+
+
 def test__Dequindre_init_exceptions():
     """Raise expected exceptions
     """
@@ -144,3 +171,458 @@ def test__run_tasks_fail_hard():
     with pytest.raises(EarlyAbortError):
         dq.run_tasks(error_handling='hard')
 
+
+
+def test__run_tasks_max_workers():
+    from dequindre import DAG, Dequindre
+    from dequindre.commons import common_task
+
+    with common_task('./tea-tasks/{}', 'python') as TeaTask:
+        boil_water = TeaTask('boil_water.py')
+        pour_water = TeaTask('pour_water.py')
+        prep_infuser = TeaTask('prep_infuser.py')
+        steep_tea = TeaTask('steep_tea.py')
+        fake_task = TeaTask('not-a-real-task.py')
+
+    make_tea = DAG(dependencies={
+        boil_water: {pour_water},
+        steep_tea: {boil_water, prep_infuser, fake_task}
+    })
+    dq = Dequindre(make_tea)
+
+    with pytest.raises(AssertionError):
+        dq.run_tasks(max_workers=0)
+
+    with pytest.raises(AssertionError):
+        dq.run_tasks(max_workers='4')
+
+    dq.run_tasks(max_workers=4)
+
+    with pytest.raises(EarlyAbortError):
+        dq.run_tasks(error_handling='hard', max_workers=4)
+
+
+def test__run_tasks_no_level_barrier():
+    """A task should start as soon as its own upstream tasks finish"""
+    import time
+
+    A = Task('A.py', 'test-env')
+    B = Task('B.py', 'test-env')
+    C = Task('C.py', 'test-env')
+    dag = DAG(tasks={A}, dependencies={C: B})
+
+    events = []
+
+    def work(task):
+        events.append(('start', task))
+        if task == A:
+            time.sleep(0.2)
+        events.append(('end', task))
+
+    dq = RecordingDequindre(dag, on_run=work)
+    dq.run_tasks(max_workers=2)
+
+    assert events.index(('start', C)) < events.index(('end', A))
+    assert events.index(('end', B)) < events.index(('start', C))
+
+
+def test__Dequindre_get_schedules_leaves_dag_alone():
+    A = Task('A.py', 'test-env')
+    B = Task('B.py', 'test-env')
+    C = Task('C.py', 'test-env')
+    dag = DAG(dependencies={B: A, C: {A, B}})
+    dq = Dequindre(dag)
+    working_dag = dq.dag
+
+    assert dq.get_schedules() == {1: {A}, 2: {B}, 3: {C}}
+    assert dq.dag is working_dag
+    assert dq.dag.tasks == {A, B, C}
+    assert dq.dag.get_downstream() == {A: {B, C}, B: {C}}
+
+
+def test__Dequindre_get_critical_paths():
+    A = Task('A.py', 'test-env')
+    B = Task('B.py', 'test-env')
+    C = Task('C.py', 'test-env')
+    Z = Task('Z.py', 'test-env')
+    dag = DAG(tasks={Z}, dependencies={B: A, C: {A, B}})
+    dq = Dequindre(dag)
+
+    assert dq.get_critical_paths() == {A: 3, B: 2, C: 1, Z: 1}
+
+    durations = {A: 10, C: 2, Z: 30}
+    assert dq.get_critical_paths(durations) == {A: 26, B: 16, C: 2, Z: 30}
+
+
+def test__run_tasks_critical_path_first():
+    A = Task('A.py', 'test-env')
+    B = Task('B.py', 'test-env')
+    C = Task('C.py', 'test-env')
+    Z = Task('Z.py', 'test-env')
+    dag = DAG(tasks={A}, dependencies={C: B})
+
+    dq = RecordingDequindre(dag)
+    dq.run_tasks()
+    assert dq.started == [B, A, C]
+
+    dag.add_task(Z)
+    dq = RecordingDequindre(dag)
+    dq.run_tasks(durations={A: 1, B: 1, C: 1, Z: 100})
+    assert dq.started[0] == Z
+
+
+def test__run_tasks_resume(tmp_path):
+    from subprocess import CalledProcessError
+
+    A = Task('A.py', 'test-env')
+    B = Task('B.py', 'test-env')
+    C = Task('C.py', 'test-env')
+    Z = Task('Z.py', 'test-env')
+    dag = DAG(tasks={Z}, dependencies={B: A, C: B})
+    checkpoint = str(tmp_path / 'checkpoint.jsonl')
+
+    broken = {B}
+
+    def work(task):
+        if task in broken:
+            raise CalledProcessError(1, task.loc)
+
+    dq = RecordingDequindre(dag, on_run=work)
+    started = dq.started
+
+    with pytest.raises(AssertionError):
+        dq.run_tasks(resume=True)
+
+    # hard errors: resume where the run stopped
+    with pytest.raises(EarlyAbortError):
+        dq.run_tasks(error_handling='hard', checkpoint=checkpoint)
+    assert started == [A, B]
+    assert dq.read_checkpoint(checkpoint) == {A}
+
+    started.clear()
+    broken.clear()
+    dq.run_tasks(checkpoint=checkpoint, resume=True)
+    assert started == [B, C, Z]
+    assert dq.read_checkpoint(checkpoint) == {A, B, C, Z}
+
+    # soft errors: rerun the failed task and everything downstream of it
+    started.clear()
+    broken.add(B)
+    dq.run_tasks(checkpoint=checkpoint)
+    assert started == [A, B, C, Z]
+    assert dq.read_checkpoint(checkpoint) == {A, Z}
+
+    started.clear()
+    broken.clear()
+    dq.run_tasks(checkpoint=checkpoint, resume=True)
+    assert started == [B, C]
+
+
+def test__run_tasks_resume_after_upstream_reruns(tmp_path):
+    """A task that succeeded before its upstream task was rerun has to run
+    again, even if the rerun was cut short"""
+    from subprocess import CalledProcessError
+
+    A, B, C, AY = (Task(f'{x}.py', 'test-env') for x in ('A', 'B', 'C', 'AY'))
+    dag = DAG(tasks={AY}, dependencies={B: A, C: B})
+    checkpoint = str(tmp_path / 'checkpoint.jsonl')
+
+    broken = {B, AY}
+
+    def work(task):
+        if task in broken:
+            raise CalledProcessError(1, task.loc)
+
+    dq = RecordingDequindre(dag, on_run=work)
+
+    # C succeeds on B's bad output
+    dq.run_tasks(checkpoint=checkpoint)
+    assert dq.read_checkpoint(checkpoint) == {A}
+
+    # B is fixed, but AY stops the run before C starts
+    broken.discard(B)
+    dq.started.clear()
+    with pytest.raises(EarlyAbortError):
+        dq.run_tasks(error_handling='hard', checkpoint=checkpoint,
+                     durations={B: 3, AY: 2, C: 1}, resume=True)
+    assert dq.started == [B, AY]
+    assert dq.read_checkpoint(checkpoint) == {A, B}
+
+    broken.clear()
+    dq.started.clear()
+    dq.run_tasks(checkpoint=checkpoint, resume=True)
+    assert set(dq.started) == {C, AY}
+    assert dq.read_checkpoint(checkpoint) == {A, B, C, AY}
+
+
+def test__run_task_without_shell(tmp_path):
+    import json
+    import sys
+
+    folder = tmp_path / 'my tea tasks'
+    folder.mkdir()
+    script = folder / 'steep tea.py'
+    result = tmp_path / 'result.json'
+    script.write_text(
+        "import json, os, sys\n"
+        f"json.dump([sys.argv[1:], os.environ['TEA'], os.getcwd()], "
+        f"open({str(result)!r}, 'w'))\n"
+    )
+    steep_tea = Task(str(script), sys.executable, args=('--cups', '2 cups'),
+                     environ={'TEA': 'green'}, cwd=str(folder))
+    dq = Dequindre(DAG(tasks={steep_tea}))
+    dq.run_tasks(error_handling='hard')
+
+    args, tea, cwd = json.loads(result.read_text())
+    assert args == ['--cups', '2 cups']
+    assert tea == 'green'
+    assert cwd == str(folder)
+
+
+def test__run_tasks_async(tmp_path, run_async):
+    import sys
+
+    log = tmp_path / 'log.txt'
+    tasks = {}
+    for name in ('boil_water', 'steep_tea', 'broken'):
+        script = tmp_path / f'{name}.py'
+        script.write_text(f"open({str(log)!r}, 'a').write('{name}\\n')\n")
+        tasks[name] = Task(str(script), sys.executable)
+    (tmp_path / 'broken.py').write_text("raise SystemExit(3)\n")
+    boil_water, steep_tea, broken = tasks.values()
+
+    dq = Dequindre(DAG(tasks={broken}, dependencies={steep_tea: boil_water}))
+
+    async def collect():
+        return [e async for e in dq.iter_tasks_async(max_workers=2)]
+
+    events = run_async(collect())
+    returncodes = {e.task: e.returncode for e in events}
+    assert returncodes == {boil_water: 0, steep_tea: 0, broken: 3}
+    assert events[-1].task == steep_tea
+    assert all(e.start <= e.end for e in events)
+
+    with pytest.raises(EarlyAbortError):
+        run_async(dq.run_tasks_async(error_handling='hard'))
+
+
+def test__run_tasks_async_options(tmp_path, run_async):
+    import sys
+    from dequindre.history import RunHistory
+
+    log = tmp_path / 'log.txt'
+    tasks = []
+    for name in 'ABC':
+        script = tmp_path / f'{name}.py'
+        script.write_text(f"open({str(log)!r}, 'a').write('{name}\\n')\n")
+        tasks.append(Task(str(script), sys.executable))
+    A, B, C = tasks
+    dq = Dequindre(DAG(dependencies={B: A, C: B}))
+    checkpoint = str(tmp_path / 'checkpoint.jsonl')
+
+    async def collect(**kwargs):
+        return [e async for e in dq.iter_tasks_async(**kwargs)]
+
+    events = run_async(collect(only=B, include_upstream=True,
+                               checkpoint=checkpoint))
+    assert [e.task for e in events] == [A, B]
+
+    with RunHistory(':memory:') as history:
+        events = run_async(collect(checkpoint=checkpoint, resume=True,
+                                   history=history))
+        assert [e.task for e in events] == [C]
+        assert len(history.get_task_runs(C)) == 1
+        assert history.get_task_runs(A) == []
+
+    assert log.read_text().split() == ['A', 'B', 'C']
+
+
+def test__run_tasks_async_cancel(tmp_path, run_async):
+    import asyncio
+    import sys
+    import time
+
+    script = tmp_path / 'slow.py'
+    script.write_text("import time\ntime.sleep(30)\n")
+    slow = Task(str(script), sys.executable)
+    dq = Dequindre(DAG(tasks={slow}))
+
+    async def cancel_run():
+        run = asyncio.ensure_future(dq.run_tasks_async())
+        await asyncio.sleep(0.5)
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+
+    start = time.time()
+    run_async(cancel_run())
+    assert time.time() - start < 10
+
+
+def test__iter_tasks_async_slow_consumer(tmp_path, run_async):
+    """Tasks keep starting while the consumer handles an event"""
+    import asyncio
+    import sys
+
+    tasks = []
+    for i in range(3):
+        script = tmp_path / f'nap{i}.py'
+        script.write_text('import time\ntime.sleep(0.1)\n')
+        tasks.append(Task(str(script), sys.executable))
+    dq = Dequindre(DAG(dependencies={tasks[1]: tasks[0], tasks[2]: tasks[1]}))
+
+    async def collect_slowly():
+        events = []
+        async for event in dq.iter_tasks_async():
+            events.append(event)
+            await asyncio.sleep(0.5)
+        return events
+
+    events = run_async(collect_slowly())
+    assert [e.task for e in events] == tasks
+    assert events[2].end - events[0].end < 0.8
+
+
+def test__iter_tasks_async_aclose(tmp_path, run_async):
+    import sys
+    import time
+
+    quick = tmp_path / 'quick.py'
+    quick.write_text('')
+    slow = tmp_path / 'slow.py'
+    slow.write_text('import time\ntime.sleep(30)\n')
+    dq = Dequindre(DAG(tasks={Task(str(quick), sys.executable),
+                              Task(str(slow), sys.executable)}))
+
+    async def close_early():
+        events = dq.iter_tasks_async(max_workers=2)
+        event = await events.__anext__()
+        await events.aclose()
+        return event
+
+    start = time.time()
+    assert run_async(close_early()).task.loc == str(quick)
+    assert time.time() - start < 10
+
+
+def test__run_tasks_capacity():
+    """Running tasks never use more than the capacity, and smaller tasks
+    fill in around a big one that has to wait"""
+    import time
+
+    big = Task('big.py', 'test-env', resources={'memory': 30})
+    bigger = Task('bigger.py', 'test-env', resources={'memory': 40})
+    small = Task('small.py', 'test-env', resources={'memory': 10, 'cpu': 1})
+    tiny = Task('tiny.py', 'test-env', resources={'db_connections': 1})
+    dag = DAG(tasks={big, bigger, small, tiny})
+    durations = {bigger: 4, big: 3, small: 2, tiny: 1}
+
+    lock = Lock()
+    in_use = []
+    peak = []
+
+    def work(task):
+        with lock:
+            in_use.append(task.resources.get('memory', 0))
+            peak.append(sum(in_use))
+        time.sleep(0.05)
+        with lock:
+            in_use.remove(task.resources.get('memory', 0))
+
+    dq = RecordingDequindre(dag, on_run=work)
+    dq.run_tasks(max_workers=4, durations=durations,
+                 capacity={'memory': 50})
+
+    assert max(peak) <= 50
+    # big doesn't fit next to bigger, so small and tiny start before it
+    assert set(dq.started[:3]) == {bigger, small, tiny}
+    assert dq.started[3] == big
+
+    with pytest.raises(AssertionError):
+        dq.run_tasks(capacity={'memory': 35})
+
+    with pytest.raises(AssertionError):
+        dq.run_tasks(capacity={'memory': -1})
+
+
+def test__run_tasks_env_limits():
+    import time
+    from dequindre import EnvLimit
+
+    shared = [Task(f'shared{i}.py', 'shared-env') for i in range(4)]
+    other = [Task(f'other{i}.py', 'other-env') for i in range(2)]
+    dag = DAG(tasks={*shared, *other})
+
+    lock = Lock()
+    running = defaultdict(int)
+    peak = defaultdict(int)
+    started = defaultdict(list)
+
+    def work(task):
+        with lock:
+            running[task.env] += 1
+            peak[task.env] = max(peak[task.env], running[task.env])
+            started[task.env].append(time.monotonic())
+        time.sleep(0.05)
+        with lock:
+            running[task.env] -= 1
+
+    dq = RecordingDequindre(dag, on_run=work, env_limits={
+        'shared-env': EnvLimit(max_concurrency=2),
+        'other-env': EnvLimit(max_launch_rate=10),
+    })
+    dq.run_tasks(max_workers=6)
+
+    assert peak['shared-env'] == 2
+    assert peak['other-env'] == 1
+    launches = started['other-env']
+    assert launches[1] - launches[0] >= 0.09
+
+    with pytest.raises(AssertionError):
+        Dequindre(dag, env_limits={'shared-env': EnvLimit(0)})
+
+    with pytest.raises(AssertionError):
+        Dequindre(dag, env_limits={'shared-env': 2})
+
+
+def test__run_tasks_async_env_limits(tmp_path, run_async):
+    import sys
+    from dequindre import EnvLimit
+
+    tasks = []
+    for i in range(3):
+        script = tmp_path / f'nap{i}.py'
+        script.write_text('import time\ntime.sleep(0.05)\n')
+        tasks.append(Task(str(script), sys.executable))
+
+    dq = Dequindre(DAG(tasks=set(tasks)), env_limits={
+        sys.executable: EnvLimit(max_concurrency=1)})
+
+    async def collect():
+        return [e async for e in dq.iter_tasks_async(max_workers=3)]
+
+    events = sorted(run_async(collect()), key=lambda e: e.start)
+    assert [e.returncode for e in events] == [0, 0, 0]
+    for before, after in zip(events, events[1:]):
+        assert before.end <= after.start
+
+
+def test__run_tasks_only():
+    A, B, C, D, Z = (Task(f'{x}.py', 'test-env') for x in 'ABCDZ')
+    dag = DAG(tasks={Z}, dependencies={B: A, C: B, D: C})
+
+    dq = RecordingDequindre(dag)
+    started = dq.started
+    dq.run_tasks(only=C)
+    assert started == [C]
+
+    started.clear()
+    dq.run_tasks(only=C, include_upstream=True)
+    assert started == [A, B, C]
+
+    started.clear()
+    dq.run_tasks(only={B}, include_downstream=True)
+    assert started == [B, C, D]
+
+    with pytest.raises(AssertionError):
+        dq.run_tasks(include_upstream=True)
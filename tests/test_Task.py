@@ -38,10 +38,8 @@ def test__Task_hash():
     B = Task('test.py', 'test-env')
 
     assert hash(A) == hash(B)
-
-    A.loc = 'new-test.py'
-
-    assert hash(A) != hash(B)
+    assert hash(A) != hash(Task('new-test.py', 'test-env'))
+    assert hash(A) != hash(Task('test.py', 'new-test-env'))
 
 
 def test__Task_eq():
@@ -49,7 +47,88 @@ def test__Task_eq():
     B = Task('test.py', 'test-env')
 
     assert A == B
+    assert A != Task('new-test.py', 'test-env')
+    assert A != Task('test.py', 'new-test-env')
+    assert A != 'test.py'
+
+
+def test__Task_immutable():
+    from copy import copy, deepcopy
+    from pickle import dumps, loads
+
+    A = Task('test.py', 'test-env')
+
+    with pytest.raises(AttributeError):
+        A.loc = 'new-test.py'
+
+    with pytest.raises(AttributeError):
+        A.new_attribute = 'new-value'
+
+    with pytest.raises(AttributeError):
+        del A.env
+
+    assert copy(A) is A
+    assert deepcopy(A) is A
+    assert deepcopy({A: [A]})[A][0] is A
+    assert loads(dumps(A)) == A
+
+
+def test__Task_inputs_outputs():
+    from copy import deepcopy
+
+    A = Task('test.py', 'test-env', inputs=['in.txt'], outputs=('out.txt',))
+    assert A.inputs == ('in.txt',)
+    assert A.outputs == ('out.txt',)
+    assert A == Task('test.py', 'test-env')
+    assert deepcopy(A).outputs == ('out.txt',)
+
+    with pytest.raises(AssertionError):
+        Task('test.py', inputs='in.txt')
+
+    with pytest.raises(AssertionError):
+        Task('test.py', outputs=('',))
+
 
-    A.loc = 'new-test.py'
+def test__Task_args_environ_cwd():
+    from pickle import dumps, loads
 
-    assert A != B
+    A = Task('test.py', 'test-env', args=['--date', '2019-02-01'],
+             environ={'TEA': 'green'}, cwd='/tmp')
+    assert A.args == ('--date', '2019-02-01')
+    assert A.environ == {'TEA': 'green'}
+    assert A.cwd == '/tmp'
+    assert A == Task('test.py', 'test-env')
+
+    B = loads(dumps(A))
+    assert (B.args, dict(B.environ), B.cwd) == (A.args, dict(A.environ), A.cwd)
+
+    with pytest.raises(TypeError):
+        A.environ['TEA'] = 'black'
+
+    with pytest.raises(AssertionError):
+        Task('test.py', args='--date')
+
+    with pytest.raises(AssertionError):
+        Task('test.py', environ={'TEA': 1})
+
+    with pytest.raises(AssertionError):
+        Task('test.py', cwd='')
+
+
+def test__Task_resources():
+    from copy import deepcopy
+
+    A = Task('test.py', 'test-env', resources={'memory': 30, 'cpu': 0.5})
+    assert A.resources == {'memory': 30, 'cpu': 0.5}
+    assert A == Task('test.py', 'test-env')
+    assert Task('test.py').resources == {}
+    assert deepcopy(A).resources == A.resources
+
+    with pytest.raises(TypeError):
+        A.resources['memory'] = 1
+
+    with pytest.raises(AssertionError):
+        Task('test.py', resources={'memory': -1})
+
+    with pytest.raises(AssertionError):
+        Task('test.py', resources={'memory': '30G'})
@@ -0,0 +1,53 @@
+"""Unit tests for the benchmarks package."""
+
+import pytest
+
+from dequindre import Dequindre
+from dequindre.compact import numpy
+
+from benchmarks.__main__ import run_benchmarks, compare
+from benchmarks.generators import (
+    chain, fan_out_fan_in, random_layered, diamond_lattice
+)
+
+
+def test__generators():
+    dag = chain(10)
+    assert len(dag.tasks) == 10
+    assert len(Dequindre(dag).get_schedules()) == 10
+
+    dag = fan_out_fan_in(10)
+    assert len(dag.tasks) == 10
+    assert len(Dequindre(dag).get_schedules()) == 3
+
+    dag = random_layered(100, width=10)
+    assert len(dag.tasks) == 100
+    assert len(Dequindre(dag).get_schedules()) == 10
+    assert random_layered(100).get_downstream() == dag.get_downstream()
+
+    dag = diamond_lattice(10)
+    assert len(dag.tasks) == 9
+    assert len(Dequindre(dag).get_schedules()) == 5
+
+    for dag in (chain(1), fan_out_fan_in(3), random_layered(1),
+                diamond_lattice(1)):
+        assert not dag.is_cyclic()
+
+    with pytest.raises(AssertionError):
+        fan_out_fan_in(2)
+
+
+def test__run_benchmarks():
+    results = list(run_benchmarks(['chain', 'diamond_lattice'], [10],
+                                  repeat=1))
+    names = {'construct', 'is_cyclic', 'get_schedules', 'run_tasks',
+             'load_dequindre', 'get_levels_python'}
+    if numpy is not None:
+        names.add('get_levels_numpy')
+    assert {r['benchmark'] for r in results} == names
+    assert len(results) == 2 * len(names)
+    assert all(r['seconds'] >= 0 for r in results)
+
+    slower = [dict(r, seconds=r['seconds'] * 2 + 1) for r in results]
+    assert compare(results, results, tolerance=0.2) == []
+    assert len(compare(slower, results, tolerance=0.2)) == len(results)
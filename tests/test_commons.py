@@ -65,3 +65,36 @@ def test__conda_shortcut():
         returned_path = conda_env(env_name)
 
     assert returned_path == correct_path
+
+
+def test__common_env_limits():
+    from dequindre import EnvLimit
+
+    prefix = pathjoin('path', 'to')
+
+    with common_conda_env(prefix, max_concurrency=2) as conda_env:
+        python27 = conda_env('python27')
+        python36 = conda_env('python36', max_launch_rate=0.5)
+
+    assert conda_env.limits == {
+        python27: EnvLimit(2, None),
+        python36: EnvLimit(2, 0.5),
+    }
+
+    with common_venv(prefix) as venv:
+        python37 = venv('python37')
+        licensed = venv('licensed', max_concurrency=1)
+
+    assert venv.limits == {licensed: EnvLimit(max_concurrency=1)}
+
+    A = Task('A.py', python27)
+    dq = Dequindre(DAG(tasks={A}), env_limits=conda_env.limits)
+    assert dq.env_limits[python27].max_concurrency == 2
+
+    # limits are keyword only, so they can't be mistaken for the suffix
+    for common_env in (common_venv, common_pipenv, common_conda_env):
+        with pytest.raises(TypeError):
+            with common_env(prefix, None, 2):
+                pass
+    with pytest.raises(TypeError):
+        venv('python37', 2)
@@ -0,0 +1,153 @@
+"""Unit tests for the compact module."""
+
+from copy import deepcopy
+
+import pytest
+
+from dequindre import Task, DAG, Dequindre
+from dequindre.compact import CompactDAG
+
+from .test_Dequindre import RecordingDequindre
+
+
+def make_dag():
+    A = Task('A.py', 'test-env', args=('--date', '2019-02-01'),
+             resources={'memory': 30})
+    B = Task('B.py', 'test-env')
+    C = Task('C.py', 'test-env')
+    C2 = Task('C.py', 'other-env', cwd='/tmp')
+    D = Task('D.py', 'test-env')
+    Z = Task('Z.py', 'test-env')
+    return DAG(tasks={Z}, dependencies={B: A, C: {A, B}, C2: B, D: {C, C2}})
+
+
+def test__CompactDAG_queries():
+    dag = make_dag()
+    compact = CompactDAG(dag)
+
+    assert len(compact) == 6
+    assert compact.tasks == dag.tasks
+    assert compact.get_downstream() == dag.get_downstream()
+    assert compact.get_upstream() == dag.get_upstream()
+    assert compact.get_sources() == dag.get_sources()
+    assert compact.get_sinks() == dag.get_sinks()
+    assert not compact.is_cyclic()
+
+    order = compact.get_topological_order()
+    position = {t: i for i, t in enumerate(order)}
+    for u, children in dag.get_downstream().items():
+        for v in children:
+            assert position[u] < position[v]
+
+    for t in dag.tasks:
+        assert t in compact
+        assert compact.get_task(compact.get_number(t)) == t
+        assert compact.get_task_downstream(t) == dag.get_task_downstream(t)
+        assert compact.get_task_upstream(t) == dag.get_task_upstream(t)
+        assert compact.get_in_degree(t) == dag.get_in_degree(t)
+        assert compact.get_out_degree(t) == dag.get_out_degree(t)
+        assert compact.ancestors(t) == dag.ancestors(t)
+        assert compact.descendants(t) == dag.descendants(t)
+
+    # extra fields survive, and tasks that share a loc are told apart
+    A = Task('A.py', 'test-env')
+    C2 = Task('C.py', 'other-env')
+    assert compact.get_task(compact.get_number(A)).args == \
+        ('--date', '2019-02-01')
+    assert compact.get_task(compact.get_number(C2)).cwd == '/tmp'
+    assert compact.get_number(C2) != compact.get_number(Task('C.py',
+                                                             'test-env'))
+    assert Task('C.py', 'no-env') not in compact
+    with pytest.raises(KeyError):
+        compact.get_number(Task('C.py', 'no-env'))
+
+    rebuilt = compact.to_dag()
+    assert rebuilt.tasks == dag.tasks
+    assert rebuilt.get_downstream() == dag.get_downstream()
+    assert deepcopy(compact) is compact
+
+
+def test__CompactDAG_load(tmp_path):
+    dag = make_dag()
+    path = str(tmp_path / 'make-tea.dag')
+    dag.save(path)
+
+    for use_mmap in (False, True):
+        compact = CompactDAG.load(path, use_mmap=use_mmap)
+        assert compact.tasks == dag.tasks
+        assert compact.get_downstream() == dag.get_downstream()
+        assert compact.get_upstream() == dag.get_upstream()
+        A = compact.get_task(compact.get_number(Task('A.py', 'test-env')))
+        assert dict(A.resources) == {'memory': 30}
+
+
+def test__CompactDAG_Dequindre():
+    dag = make_dag()
+    compact = CompactDAG(dag)
+    dq = Dequindre(dag)
+    compact_dq = Dequindre(compact)
+
+    assert compact_dq.dag is compact
+    assert compact_dq.get_schedules() == dq.get_schedules()
+    assert compact_dq.get_critical_paths() == dq.get_critical_paths()
+
+    def run_locs(dag, **kwargs):
+        """The locs of the tasks run, in order. Tasks that share a loc can
+        start in either order."""
+        dq = RecordingDequindre(dag)
+        dq.run_tasks(**kwargs)
+        return [t.loc for t in dq.started]
+
+    assert run_locs(compact) == run_locs(dag)
+
+    B = Task('B.py', 'test-env')
+    C2 = Task('C.py', 'other-env')
+    for kwargs in ({'only': B}, {'only': {B, C2}},
+                   {'only': B, 'include_upstream': True},
+                   {'only': C2, 'include_downstream': True},
+                   {'only': C2, 'include_upstream': True,
+                    'include_downstream': True}):
+        assert run_locs(compact, **kwargs) == run_locs(dag, **kwargs)
+        subdag = compact.subdag(kwargs['only'],
+                                kwargs.get('include_upstream', False),
+                                kwargs.get('include_downstream', False))
+        expected = dag.subdag(kwargs['only'],
+                              kwargs.get('include_upstream', False),
+                              kwargs.get('include_downstream', False))
+        assert subdag.tasks == expected.tasks
+        assert subdag.get_downstream() == expected.get_downstream()
+
+    # dependencies through tasks that were left out are kept
+    A, D = Task('A.py', 'test-env'), Task('D.py', 'test-env')
+    assert compact.subdag({A, D}).get_downstream() == {A: {D}}
+
+    with pytest.raises(AssertionError):
+        compact.subdag(Task('not-in-the-dag.py'))
+
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+def test__CompactDAG_get_levels(monkeypatch, use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr('dequindre.compact.numpy', None)
+
+    # wide levels, then narrow ones, then wide again
+    sources = {Task(f'source-{i}.py', 'test-env') for i in range(100)}
+    hub, step, spoke = Task('hub.py'), Task('step.py'), Task('spoke.py')
+    fans = {Task(f'fan-{i}.py', 'test-env') for i in range(100)}
+    sink = Task('sink.py')
+    dag = DAG(tasks={Task('lone.py')},
+              dependencies={hub: sources, step: hub, spoke: {hub, step},
+                            sink: fans})
+    for fan in fans:
+        dag.add_dependencies({fan: {spoke, hub}})
+    compact = CompactDAG(dag)
+
+    expected = Dequindre(dag).get_task_schedules()
+    assert compact.get_task_levels() == expected
+    if not use_numpy:
+        with pytest.raises(AssertionError):
+            compact.get_levels(use_numpy=True)
+    assert Dequindre(compact).get_schedules() == \
+        Dequindre(dag).get_schedules()
@@ -0,0 +1,191 @@
+"""Unit tests for the distributed module."""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+from threading import Thread
+
+import pytest
+
+from dequindre import Task, DAG, Dequindre
+from dequindre.distributed import Coordinator, Worker
+from dequindre.exceptions import EarlyAbortError
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_task(tmp_path, name, code=''):
+    script = tmp_path / f'{name}.py'
+    script.write_text(
+        f"open({str(tmp_path / 'log.txt')!r}, 'a').write('{name}\\n')\n"
+        + code)
+    return Task(str(script), sys.executable)
+
+
+def read_log(tmp_path):
+    return (tmp_path / 'log.txt').read_text().split()
+
+
+def start_worker(coordinator, name, **kwargs):
+    host, port = coordinator.address
+    worker = Worker(host, port, name=name, heartbeat_interval=0.1, **kwargs)
+    thread = Thread(target=worker.run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test__Coordinator_run_tasks(tmp_path):
+    A = make_task(tmp_path, 'A')
+    B = make_task(tmp_path, 'B')
+    C = make_task(tmp_path, 'C')
+    D = make_task(tmp_path, 'D', 'import sys\nsys.exit(2)\n')
+    dq = Dequindre(DAG(dependencies={C: {A, B}, D: C}))
+
+    with Coordinator(dq) as coordinator:
+        host, port = coordinator.address
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        workers = [
+            subprocess.Popen(
+                [sys.executable, '-m', 'dequindre', 'worker', '--host', host,
+                 '--port', str(port), '--slots', '2', '--name', f'w{i}',
+                 '--heartbeat-interval', '0.1'], env=env)
+            for i in range(2)
+        ]
+        events = coordinator.run_tasks()
+
+        log = read_log(tmp_path)
+        assert sorted(log[:2]) == ['A', 'B']
+        assert log[2:] == ['C', 'D']
+        assert {e.task: e.returncode for e in events} == \
+            {A: 0, B: 0, C: 0, D: 2}
+
+        with pytest.raises(EarlyAbortError):
+            coordinator.run_tasks(error_handling='hard')
+
+    for worker in workers:
+        assert worker.wait(timeout=10) == 0
+
+
+@pytest.mark.parametrize('lost_by', ['disconnect', 'heartbeat'])
+def test__Coordinator_reassigns_lost_tasks(tmp_path, lost_by):
+    A = make_task(tmp_path, 'A')
+    dq = Dequindre(DAG(tasks={A}))
+
+    with Coordinator(dq, heartbeat_timeout=0.5) as coordinator:
+        # a worker that takes a task and never finishes it
+        flaky = socket.create_connection(coordinator.address)
+        flaky.sendall(json.dumps(
+            {'type': 'hello', 'name': 'flaky', 'slots': 1}).encode() + b'\n')
+
+        def take_task_then_fail():
+            with flaky.makefile('rb') as ifile:
+                message = json.loads(ifile.readline())
+            assert message['task']['loc'] == A.loc
+            start_worker(coordinator, 'steady')
+            if lost_by == 'disconnect':
+                flaky.close()
+
+        thread = Thread(target=take_task_then_fail)
+        thread.start()
+        events = coordinator.run_tasks()
+        thread.join()
+        flaky.close()
+
+    assert [(e.task, e.returncode) for e in events] == [(A, 0)]
+    assert read_log(tmp_path) == ['A']
+
+
+def test__Coordinator_run_tasks_options(tmp_path):
+    from dequindre import EnvLimit
+
+    A = make_task(tmp_path, 'A')
+    B = make_task(tmp_path, 'B', 'import time\ntime.sleep(0.05)\n')
+    C = make_task(tmp_path, 'C', 'import time\ntime.sleep(0.05)\n')
+    Z = make_task(tmp_path, 'Z')
+    dq = Dequindre(DAG(tasks={Z}, dependencies={B: A, C: A}),
+                   env_limits={sys.executable: EnvLimit(max_concurrency=1)})
+    checkpoint = str(tmp_path / 'checkpoint.jsonl')
+
+    with Coordinator(dq) as coordinator:
+        start_worker(coordinator, 'wide', slots=4)
+        events = coordinator.run_tasks(only={B, C}, checkpoint=checkpoint)
+
+    # only B and C ran, one at a time, and both were journaled
+    assert sorted(read_log(tmp_path)) == ['B', 'C']
+    first, second = sorted(events, key=lambda e: e.start)
+    assert first.end <= second.start
+    with open(checkpoint) as ifile:
+        assert sorted(json.loads(line)['loc'] for line in ifile) == \
+            sorted([B.loc, C.loc])
+
+
+HELLO = {'type': 'hello', 'name': 'rogue', 'slots': 1}
+
+
+@pytest.mark.parametrize('hello, result', [
+    ({'type': 'hello', 'name': 'rogue', 'slots': 0}, None),
+    ({'type': 'hello', 'name': 0, 'slots': 1}, None),
+    ({'name': 'rogue', 'slots': 1}, None),
+    (['hello'], None),
+    (HELLO, {'id': 1, 'returncode': 0, 'start': 0, 'end': 1}),
+    (HELLO, {'type': 'result', 'id': 1, 'returncode': 0}),
+    (HELLO, {'type': 'result', 'id': 1, 'returncode': '0', 'start': 0,
+             'end': 1}),
+    (HELLO, 'done'),
+])
+def test__Coordinator_disconnects_bad_workers(tmp_path, hello, result):
+    A = make_task(tmp_path, 'A')
+    dq = Dequindre(DAG(tasks={A}))
+    closed = []
+
+    with Coordinator(dq) as coordinator:
+        rogue = socket.create_connection(coordinator.address)
+        rogue.settimeout(10)
+
+        def misbehave():
+            try:
+                rogue.sendall(json.dumps(hello).encode() + b'\n')
+                if result is not None:
+                    with rogue.makefile('rb') as ifile:
+                        assert json.loads(ifile.readline())['id'] == 1
+                    rogue.sendall(json.dumps(result).encode() + b'\n')
+                closed.append(rogue.recv(1) == b'')
+            finally:
+                start_worker(coordinator, 'steady')
+
+        thread = Thread(target=misbehave)
+        thread.start()
+        events = coordinator.run_tasks()
+        thread.join()
+        rogue.close()
+
+    assert closed == [True]
+    assert [(e.task, e.returncode) for e in events] == [(A, 0)]
+
+
+def test__Worker_reports_tasks_it_cant_run():
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+    host, port = server.getsockname()
+    thread = Thread(target=Worker(host, port, name='w').run, daemon=True)
+    thread.start()
+
+    sock, _ = server.accept()
+    sock.settimeout(10)
+    with sock, server, sock.makefile('rb') as ifile:
+        assert json.loads(ifile.readline())['type'] == 'hello'
+        sock.sendall(json.dumps({'type': 'task', 'id': 7,
+                                 'task': {'loc': 7}}).encode() + b'\n')
+        message = json.loads(ifile.readline())
+        while message['type'] == 'heartbeat':
+            message = json.loads(ifile.readline())
+        assert message['type'] == 'result'
+        assert message['id'] == 7
+        assert message['returncode'] is None
+        sock.sendall(b'{"type": "shutdown"}\n')
+        thread.join(timeout=10)
+    assert not thread.is_alive()
@@ -0,0 +1,85 @@
+"""Unit tests for the fingerprints module."""
+
+import sys
+
+from dequindre import Task, DAG, Dequindre
+from dequindre.fingerprints import FingerprintStore
+
+
+def write_script(path, source, target, log):
+    path.write_text(
+        f"open({str(log)!r}, 'a').write({path.name!r} + '\\n')\n"
+        f"data = open({str(source)!r}).read()\n"
+        f"open({str(target)!r}, 'w').write(data)\n"
+    )
+
+
+def test__FingerprintStore(tmp_path):
+    script = tmp_path / 'task.py'
+    script.write_text('pass\n')
+    data = tmp_path / 'data.txt'
+    data.write_text('tea')
+    out = tmp_path / 'out.txt'
+    A = Task(str(script), 'test-env', inputs=(str(data),),
+             outputs=(str(out),))
+    path = str(tmp_path / 'fingerprints.json')
+
+    with FingerprintStore(path) as fingerprints:
+        fp = fingerprints.fingerprint(A)
+        assert fp == fingerprints.fingerprint(A)
+        assert fp != fingerprints.fingerprint(Task(str(script), 'other-env'))
+        assert fingerprints.fingerprint(Task('not-a-real-task.py')) is None
+
+        assert not fingerprints.is_up_to_date(A, fp)
+        fingerprints.update(A, fp)  # out.txt doesn't exist yet
+        assert not fingerprints.is_up_to_date(A, fp)
+
+        out.write_text('tea')
+        fingerprints.update(A, fp)
+        assert fingerprints.is_up_to_date(A, fp)
+
+    fingerprints = FingerprintStore(path)
+    assert fingerprints.is_up_to_date(A, fingerprints.fingerprint(A))
+
+    data.write_text('coffee')
+    assert not fingerprints.is_up_to_date(A, fingerprints.fingerprint(A))
+
+
+def test__run_tasks_fingerprints(tmp_path):
+    log = tmp_path / 'log.txt'
+    water = tmp_path / 'water.txt'
+    water.write_text('water')
+    hot_water = tmp_path / 'hot_water.txt'
+    tea = tmp_path / 'tea.txt'
+
+    boil = tmp_path / 'boil_water.py'
+    steep = tmp_path / 'steep_tea.py'
+    write_script(boil, water, hot_water, log)
+    write_script(steep, hot_water, tea, log)
+
+    boil_water = Task(str(boil), sys.executable, inputs=(str(water),),
+                      outputs=(str(hot_water),))
+    steep_tea = Task(str(steep), sys.executable, outputs=(str(tea),))
+    dq = Dequindre(DAG(dependencies={steep_tea: boil_water}))
+
+    def run():
+        log.write_text('')
+        with FingerprintStore(str(tmp_path / 'fp.json')) as fingerprints:
+            dq.run_tasks(error_handling='hard', fingerprints=fingerprints)
+        return log.read_text().split()
+
+    assert run() == ['boil_water.py', 'steep_tea.py']
+    assert run() == []
+
+    # a changed input reruns the task and everything downstream of it
+    water.write_text('more water')
+    assert run() == ['boil_water.py', 'steep_tea.py']
+    assert run() == []
+
+    # a changed script reruns only that task
+    steep.write_text(steep.read_text() + '# stronger\n')
+    assert run() == ['steep_tea.py']
+
+    # missing outputs are rebuilt
+    tea.unlink()
+    assert run() == ['steep_tea.py']
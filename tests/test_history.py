@@ -0,0 +1,74 @@
+"""Unit tests for the history module."""
+
+import os
+from os.path import dirname, join as pathjoin
+import sys
+
+import pytest
+
+from dequindre import Task, DAG, Dequindre
+from dequindre.history import RunHistory, percentile
+
+
+TEA_TASKS = pathjoin(dirname(__file__), 'tea-tasks')
+
+
+def test__percentile():
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([4.0, 1.0, 3.0, 2.0], 50) == 2.5
+    assert percentile([1.0, 2.0, 3.0, 4.0, 5.0], 0) == 1.0
+    assert percentile([1.0, 2.0, 3.0, 4.0, 5.0], 100) == 5.0
+
+    with pytest.raises(AssertionError):
+        percentile([], 50)
+
+    with pytest.raises(AssertionError):
+        percentile([1.0], 101)
+
+
+def test__RunHistory_record():
+    A = Task('A.py', 'test-env')
+    B = Task('B.py', 'test-env')
+
+    with RunHistory(':memory:') as history:
+        run_id = history.start_run()
+        for i in range(1, 11):
+            history.record(run_id, A, 100.0, 100.0 + i, 0)
+        history.record(run_id, A, 100.0, 200.0, 1)
+
+        assert len(history.get_task_runs(A)) == 11
+        assert history.get_durations(A) == [float(i) for i in range(1, 11)]
+        assert len(history.get_durations(A, successful_only=False)) == 11
+        assert history.get_duration_percentile(A, 50) == 5.5
+        assert history.get_duration_percentile(A, 95) == pytest.approx(9.55)
+        assert history.get_duration_percentile(B) is None
+        assert history.get_duration_estimates({A, B}) == {A: 5.5}
+
+
+def test__run_tasks_history(tmp_path):
+    boil_water = Task(pathjoin(TEA_TASKS, 'boil_water.py'), sys.executable)
+    steep_tea = Task(pathjoin(TEA_TASKS, 'steep_tea.py'), sys.executable)
+    fake_task = Task(pathjoin(TEA_TASKS, 'not-a-real-task.py'),
+                     sys.executable)
+    dag = DAG(dependencies={steep_tea: {boil_water, fake_task}})
+    dq = Dequindre(dag)
+
+    path = str(tmp_path / 'history.sqlite3')
+    with RunHistory(path) as history:
+        dq.run_tasks(history=history)
+
+    with RunHistory(path) as history:
+        dq.run_tasks(history=history)
+
+        runs = history.get_task_runs(boil_water)
+        assert len(runs) == 2
+        assert runs[0]['run_id'] != runs[1]['run_id']
+        assert all(r['returncode'] == 0 for r in runs)
+        assert all(r['duration'] > 0 for r in runs)
+
+        failed = history.get_task_runs(fake_task)
+        assert [r['returncode'] for r in failed] == [2, 2]
+        assert history.get_durations(fake_task) == []
+
+        if hasattr(os, 'wait4'):
+            assert runs[0]['max_rss'] > 0
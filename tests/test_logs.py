@@ -0,0 +1,90 @@
+"""Unit tests for the logs module."""
+
+import gzip
+import sys
+
+import pytest
+
+from dequindre import Task, DAG, Dequindre
+from dequindre.exceptions import EarlyAbortError
+from dequindre.logs import TaskLogs
+
+
+def test__TaskLog_tail(tmp_path):
+    logs = TaskLogs(str(tmp_path), tail_bytes=4)
+    A = Task('a/tea.py', 'test-env')
+    B = Task('b/tea.py', 'test-env')
+    assert logs.get_path(A) != logs.get_path(B)
+    assert logs.get_tail(A) is None
+
+    log = logs.open(A)
+    log.write(b'abc')
+    log.write(b'defgh')
+    log.write(b'i')
+    log.close()
+
+    assert logs.get_tail(A) == b'fghi'
+    with open(logs.get_path(A), 'rb') as ifile:
+        assert ifile.read() == b'abcdefghi'
+
+    log = TaskLogs(str(tmp_path), tail_bytes=0).open(A)
+    log.write(b'abc')
+    assert log.tail == b''
+
+
+def test__TaskLogs_max_tails(tmp_path):
+    A, B, C, D = (Task(f'{x}.py', 'test-env') for x in 'ABCD')
+    logs = TaskLogs(str(tmp_path), max_tails=2)
+    for task in (A, B, C, B, D):
+        log = logs.open(task)
+        log.write(task.loc.encode())
+        log.close()
+
+    # the tails of the tasks that started longest ago are dropped
+    assert logs.get_tail(A) is None
+    assert logs.get_tail(C) is None
+    assert logs.get_tail(B) == b'B.py'
+    assert logs.get_tail(D) == b'D.py'
+
+    with pytest.raises(AssertionError):
+        TaskLogs(str(tmp_path), max_tails=0)
+
+
+def test__run_tasks_logs(tmp_path, capsys, run_async):
+    chatty = tmp_path / 'chatty.py'
+    # far more output than fits in a pipe buffer
+    chatty.write_text(
+        "import sys\n"
+        "for i in range(20000):\n"
+        "    print(f'line {i}')\n"
+        "print('oops', file=sys.stderr)\n"
+        "sys.exit(1)\n"
+    )
+    task = Task(str(chatty), sys.executable)
+    logs = TaskLogs(str(tmp_path / 'logs'), compress=True, tail_bytes=1024)
+    dq = Dequindre(DAG(tasks={task}), logs=logs)
+
+    with pytest.raises(EarlyAbortError):
+        dq.run_tasks(error_handling='hard')
+
+    assert logs.get_path(task).endswith('.log.gz')
+    with gzip.open(logs.get_path(task), 'rb') as ifile:
+        output = ifile.read()
+    assert output.startswith(b'line 0\n')
+    assert output.endswith(b'line 19999\noops\n')
+
+    tail = logs.get_tail(task)
+    assert len(tail) == 1024
+    assert tail.endswith(b'oops\n')
+
+    printed = capsys.readouterr().out
+    assert 'oops' in printed
+    assert 'line 0\n' not in printed
+
+    events = run_async(_collect(dq))
+    assert [e.returncode for e in events] == [1]
+    assert logs.get_tail(task).endswith(b'line 19999\noops\n')
+
+
+async def _collect(dq):
+    return [e async for e in dq.iter_tasks_async()]
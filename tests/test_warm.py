@@ -0,0 +1,90 @@
+"""Unit tests for the warm module."""
+
+import os
+import sys
+
+import pytest
+
+from dequindre import Task, DAG, Dequindre
+from dequindre.exceptions import EarlyAbortError
+from dequindre.warm import WarmPool
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'),
+                                reason='warm pools need os.fork')
+
+
+def test__WarmPool_run(tmp_path):
+    log = tmp_path / 'log.txt'
+    script = tmp_path / 'task.py'
+    script.write_text(
+        "import os, sys\n"
+        f"open({str(log)!r}, 'a').write(f'{{os.getppid()}} {{__name__}}\\n')\n"
+    )
+    failing = tmp_path / 'failing.py'
+    failing.write_text("import sys\nsys.exit(3)\n")
+
+    with WarmPool(preload=('json',)) as pool:
+        A = Task(str(script), sys.executable)
+        assert pool.run(A).returncode == 0
+        assert pool.run(A).returncode == 0
+        assert pool.run(Task(str(failing), sys.executable)).returncode == 3
+        missing = Task(str(tmp_path / 'not-a-real-task.py'), sys.executable)
+        assert pool.run(missing).returncode == 1
+
+    lines = log.read_text().splitlines()
+    assert len(lines) == 2
+    assert lines[0] == lines[1]  # same worker, both run as __main__
+    assert lines[0].endswith('__main__')
+
+
+def test__run_tasks_warm_pool(tmp_path):
+    log = tmp_path / 'log.txt'
+    tasks = []
+    for name in ('boil_water', 'steep_tea', 'broken'):
+        script = tmp_path / f'{name}.py'
+        script.write_text(f"open({str(log)!r}, 'a').write('{name}\\n')\n")
+        tasks.append(Task(str(script), sys.executable))
+    boil_water, steep_tea, broken = tasks
+    (tmp_path / 'broken.py').write_text("raise ValueError('no tea')\n")
+
+    with WarmPool() as pool:
+        dq = Dequindre(DAG(dependencies={steep_tea: boil_water}),
+                       warm_pool=pool)
+        dq.run_tasks(max_workers=2)
+        assert log.read_text().split() == ['boil_water', 'steep_tea']
+
+        dq = Dequindre(DAG(tasks={broken}), warm_pool=pool)
+        with pytest.raises(EarlyAbortError):
+            dq.run_tasks(error_handling='hard')
+
+
+def test__run_tasks_async_warm_pool_cancel(tmp_path, run_async):
+    import asyncio
+    import time
+
+    done = tmp_path / 'done.txt'
+    script = tmp_path / 'slow.py'
+    script.write_text(
+        f"import time\ntime.sleep(30)\nopen({str(done)!r}, 'w').close()\n")
+    slow = Task(str(script), sys.executable)
+
+    with WarmPool() as pool:
+        dq = Dequindre(DAG(tasks={slow}), warm_pool=pool)
+
+        async def cancel_run():
+            run = asyncio.ensure_future(dq.run_tasks_async())
+            await asyncio.sleep(0.5)
+            run.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await run
+
+        start = time.time()
+        run_async(cancel_run())
+        assert time.time() - start < 10
+        assert not done.exists()
+
+        # the task was killed, and its worker is still usable
+        fast = tmp_path / 'fast.py'
+        fast.write_text('')
+        assert pool.run(Task(str(fast), sys.executable)).returncode == 0
+        assert len(pool._idle[sys.executable]) == 1